@@ -0,0 +1,211 @@
+"""Async client for the SolaxCloud realtime API."""
+import asyncio
+import logging
+import time
+
+import aiohttp
+
+from datetime import datetime
+
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.storage import Store
+
+from .local import async_read, to_result
+from .metrics import FetchMetrics
+from .snapshot import EMPTY_SNAPSHOT, Snapshot
+from .const import (
+    API_URL,
+    DOMAIN,
+    LOCAL_RETRY_INTERVAL,
+    REQUEST_TIMEOUT,
+    STORAGE_SAVE_DELAY,
+    STORAGE_VERSION,
+)
+
+
+class SolaxCloud:
+    def __init__(self, hass, name, api_key, sn, battery, api_url=API_URL,
+                 local_url=None, local_password=None):
+        self.hass = hass
+        self.logger = logging.getLogger(__name__)
+        self.api_key = api_key
+        self.sn = sn
+        self.battery = battery
+        self.inverter_name = name
+        # Everything known about the inverter's data, including when it was
+        # retrieved, is published as one immutable snapshot. Readers take the
+        # reference once and can never see a half-updated state.
+        self.snapshot = EMPTY_SNAPSHOT
+        # The access point can be pointed at a local stand-in for testing
+        self.api_url = api_url
+        self.params = {'tokenId': api_key, 'sn': sn}
+        # Optional WiFi dongle on the LAN, preferred over the cloud while it
+        # answers. Its password defaults to its registration number.
+        self.local_url = local_url
+        self.local_password = local_password or sn
+        self._local_retry_at = 0
+        # Consecutive failed fetches; the last good data is kept meanwhile
+        self.failures = 0
+        self.last_error = None
+        self.metrics = FetchMetrics()
+        # Home Assistant's shared, pooled session: every inverter reuses the
+        # same connections instead of opening its own
+        self.session = async_get_clientsession(hass)
+        self.store = Store(hass, STORAGE_VERSION, f'{DOMAIN}.{sn}')
+        # Raw responses are captured for replay if a PayloadRecorder is set
+        self.recorder = None
+
+    # Whether the next fetch goes to the dongle rather than the cloud
+    @property
+    def local_ready(self):
+        return self.local_url is not None and time.monotonic() >= self._local_retry_at
+
+    @property
+    def last_data_time(self):
+        return self.snapshot.fetched_at
+
+    # Time since the current data was retrieved
+    @property
+    def data_age(self):
+        fetched_at = self.snapshot.fetched_at
+        if fetched_at is None:
+            return None
+        return datetime.now() - fetched_at
+
+    # Warm start from the last good payload persisted before a restart
+    async def async_restore(self):
+        cached = await self.store.async_load()
+        if cached:
+            self.snapshot = Snapshot.from_result(
+                cached['result'], datetime.fromisoformat(cached['last_data_time']))
+
+    def _data_to_store(self):
+        snapshot = self.snapshot
+        return {'result': snapshot.to_result(),
+                'last_data_time': snapshot.fetched_at.isoformat()}
+
+    # Swap in a new snapshot: a single reference assignment, atomic for every
+    # reader whichever thread it runs in
+    def publish(self, snapshot):
+        self.snapshot = snapshot
+
+    # Retrieve data from the dongle if it is reachable, otherwise from the API
+    # access point. Cadence and de-duplication are the coordinator's job, so
+    # every call here is a real request. On failure the last good data is kept
+    # and served as stale. Returns whether it succeeded.
+    async def async_get_data(self):
+        if self.local_ready:
+            return await self._async_get_local_data()
+        start = time.monotonic()
+        try:
+            async with self.session.get(
+                    self.api_url, params=self.params, timeout=REQUEST_TIMEOUT) as response:
+                response.raise_for_status()
+                # The API answers with a text/html content type
+                data = await response.json(content_type=None)
+        except aiohttp.ClientResponseError as e:
+            # Not repr(e): it holds the request URL, token included
+            self.metrics.record_request(time.monotonic() - start, type(e).__name__)
+            return self._fetch_failed(f'HTTP {e.status} {e.message}')
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            self.metrics.record_request(time.monotonic() - start, type(e).__name__)
+            return self._fetch_failed(repr(e))
+        latency = time.monotonic() - start
+        fetched_at = datetime.now()
+        if self.recorder is not None:
+            self.recorder.record(self.sn, 'cloud', fetched_at, latency, data)
+        return self.handle_response(data, latency, fetched_at)
+
+    # Publish the data of a raw API response, fetched just now or replayed
+    # from a capture. Returns whether it held data.
+    def handle_response(self, data, latency, fetched_at):
+        try:
+            if data['success'] != True:
+                self.metrics.record_request(latency, 'ApiError')
+                return self._fetch_failed(data.get('exception'))
+            snapshot = Snapshot.from_result(data['result'], fetched_at)
+        except (KeyError, TypeError, AttributeError) as e:
+            self.metrics.record_request(latency, type(e).__name__)
+            return self._fetch_failed(repr(e))
+        self.metrics.record_request(latency)
+        return self._fetch_succeeded(snapshot)
+
+    # Retrieve several inverters on this token in one request, for the
+    # scheduler to hand out. Returns the results by serial number, or None if
+    # the API did not answer with a list of results. Failed requests raise.
+    async def async_get_batch(self, sns):
+        start = time.monotonic()
+        params = {'tokenId': self.api_key, 'sn': ','.join(sns)}
+        try:
+            async with self.session.get(
+                    self.api_url, params=params, timeout=REQUEST_TIMEOUT) as response:
+                response.raise_for_status()
+                data = await response.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            self.metrics.record_request(time.monotonic() - start, type(e).__name__)
+            raise
+        if self.recorder is not None:
+            self.recorder.record(sns, 'batch', datetime.now(), time.monotonic() - start, data)
+        if (not isinstance(data, dict) or data.get('success') != True
+                or not isinstance(data.get('result'), list)):
+            self.metrics.record_request(time.monotonic() - start, 'BatchRejected')
+            return None
+        self.metrics.record_request(time.monotonic() - start)
+        return {item.get('sn'): item for item in data['result'] if isinstance(item, dict)}
+
+    # Take this inverter's share of a batch request: its result, or the error
+    # that failed the request
+    def set_result(self, result, error=None, fetched_at=None):
+        if error is not None:
+            return self._fetch_failed(error)
+        try:
+            snapshot = Snapshot.from_result(result, fetched_at or datetime.now())
+        except (AttributeError, TypeError) as e:
+            return self._fetch_failed(repr(e))
+        return self._fetch_succeeded(snapshot)
+
+    # A dongle that does not answer is not an outage: it is set aside for the
+    # retry interval and the caller falls back to the cloud
+    async def _async_get_local_data(self):
+        start = time.monotonic()
+        try:
+            data = await async_read(self.session, self.local_url, self.local_password)
+            fetched_at = datetime.now()
+            if self.recorder is not None:
+                self.recorder.record(
+                    self.sn, 'local', fetched_at, time.monotonic() - start, data)
+            snapshot = Snapshot.from_result(to_result(data, fetched_at), fetched_at)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError,
+                KeyError, TypeError, IndexError, AttributeError) as e:
+            self.metrics.record_request(time.monotonic() - start, type(e).__name__, local=True)
+            # Warn when the dongle goes away, not on every retry after that
+            log = self.logger.debug if self._local_retry_at else self.logger.warning
+            log(f'SolaxCloud {self.inverter_name} dongle unreachable, using the cloud '
+                f'for {LOCAL_RETRY_INTERVAL}: {e!r}')
+            self._local_retry_at = time.monotonic() + LOCAL_RETRY_INTERVAL.total_seconds()
+            return False
+        self.metrics.record_request(time.monotonic() - start, local=True)
+        self._local_retry_at = 0
+        return self._fetch_succeeded(snapshot)
+
+    def _fetch_succeeded(self, snapshot):
+        self.publish(snapshot)
+        self.store.async_delay_save(self._data_to_store, STORAGE_SAVE_DELAY)
+        if self.failures:
+            self.logger.info(
+                f'SolaxCloud {self.inverter_name} recovered after {self.failures} failed fetch(es)')
+        else:
+            self.logger.debug(
+                f'Retrieved new data from SolaxCloud {self.inverter_name}')
+        self.failures = 0
+        self.last_error = None
+        return True
+
+    def _fetch_failed(self, error):
+        self.failures += 1
+        self.last_error = error
+        # Only the first failure of an outage is worth an error in the log
+        log = self.logger.error if self.failures == 1 else self.logger.debug
+        log(f'Error fetching SolaxCloud {self.inverter_name} '
+            f'(attempt {self.failures}): {error}')
+        return False
@@ -0,0 +1,58 @@
+"""Capture of raw SolaxCloud responses, for replay by tools/replay.py."""
+import json
+import logging
+
+from logging.handlers import RotatingFileHandler
+
+from homeassistant.core import callback
+
+from .const import CAPTURE_BACKUPS, CAPTURE_MAX_BYTES, DOMAIN
+
+
+# Get the recorder writing to `path`, shared by every inverter capturing there
+@callback
+def async_get_recorder(hass, path):
+    recorders = hass.data.setdefault(DOMAIN, {}).setdefault('recorders', {})
+    path = hass.config.path(path)
+    if path not in recorders:
+        recorders[path] = PayloadRecorder(hass, path)
+    return recorders[path]
+
+
+class PayloadRecorder:
+    # Appends each raw response as a JSON line, with the inverter (the list
+    # of them for a batch), where it came from ('cloud', 'batch' or 'local'),
+    # when it was fetched and how long it took. The file is rotated by size
+    # like a log, with the same numbered backups. File I/O runs in the
+    # executor, off the event loop.
+    def __init__(self, hass, path):
+        self.hass = hass
+        self.path = path
+        self._logger = logging.Logger(f'{DOMAIN}.capture', logging.INFO)
+        handler = RotatingFileHandler(
+            path, maxBytes=CAPTURE_MAX_BYTES, backupCount=CAPTURE_BACKUPS, delay=True)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        self._logger.addHandler(handler)
+
+    @callback
+    def record(self, sn, source, fetched_at, latency, data):
+        line = json.dumps({
+            'sn': sn,
+            'source': source,
+            'fetched_at': fetched_at.isoformat(),
+            'latency': round(latency, 4),
+            'data': data,
+        }, separators=(',', ':'))
+        self.hass.async_add_executor_job(self._logger.info, line)
+
+
+# Read back the records of capture files in order, skipping lines cut short
+# when Home Assistant stopped mid-write
+def read_records(paths):
+    for path in paths:
+        with open(path) as file:
+            for line in file:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
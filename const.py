@@ -0,0 +1,98 @@
+"""Constants for the SolaxCloud Component."""
+from datetime import timedelta
+
+import aiohttp
+
+DOMAIN = "solaxcloud"
+
+CONF_NAME = "name"
+CONF_API_KEY = "api_key"
+CONF_SN = "sn"
+CONF_HAS_BATTERY = "battery"
+CONF_DIAGNOSTICS = "diagnostics"
+CONF_BATTERY_CAPACITY = "battery_capacity"
+CONF_HISTORY = "history"
+CONF_BATCH = "batch"
+CONF_CAPTURE = "capture"
+CONF_LOCAL_HOST = "local_host"
+CONF_LOCAL_PASSWORD = "local_password"
+CONF_STATISTICS = "statistics"
+CONF_NOWCAST = "nowcast"
+
+SERVICE_IMPORT_HISTORY = "import_history"
+ATTR_PATH = "path"
+
+# On-disk store of the last good payload of each inverter
+STORAGE_VERSION = 1
+STORAGE_SAVE_DELAY = 10
+
+# Realtime data access point (API documentation section 3)
+API_URL = 'https://www.solaxcloud.com/proxyApp/proxy/api/getRealtimeInfo.do'
+
+# The API allows for a maximum of 10 calls per minute per token. Only plan to
+# use part of it, leaving room for clock skew and other clients of the token.
+API_RATE_LIMIT = 10
+API_RATE_PERIOD = timedelta(minutes=1)
+API_RATE_HEADROOM = 0.8
+
+# Inverters on one token fetched per batched request, when the API answers
+# queries for several comma-separated serial numbers
+BATCH_SIZE = 10
+
+# Fastest frequency of data retrieval for an inverter. Polls are stretched
+# beyond this when many inverters share one token's rate limit.
+MIN_TIME_BETWEEN_UPDATES = timedelta(minutes=1)
+
+# Inverters upload to the cloud on a fixed cadence. Poll this long after an
+# expected upload so the new data has reached the API.
+UPLOAD_GRACE = timedelta(seconds=30)
+
+# Wait, Idle and Standby Mode (Table 5): the inverter is asleep, typically
+# overnight, and its data will not change until it wakes up
+SLEEP_STATUS_CODES = ('100', '109', '110')
+SLEEP_POLL_INTERVAL = timedelta(minutes=30)
+
+# Longest time between two uploads that energy is integrated over; across a
+# longer gap the power in between is unknown (MAX_UPLOAD_MISSES uploads)
+MAX_INTEGRATION_GAP = timedelta(minutes=15)
+
+# Failed fetches are retried with jittered exponential backoff from the poll
+# interval up to this ceiling
+BACKOFF_MAX = timedelta(hours=1)
+
+# Consecutive failures on a token that open its circuit: polling stops for the
+# cooldown, then a single probe decides whether to resume or wait twice as long
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_COOLDOWN = timedelta(minutes=5)
+
+# Bound every request so a hung TLS handshake or a stalled response can never
+# hold a poll open indefinitely
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=30, connect=10, sock_read=20)
+
+# Raw responses are captured to a file rotated at this size, keeping this
+# many earlier files
+CAPTURE_MAX_BYTES = 10 * 2 ** 20
+CAPTURE_BACKUPS = 5
+
+# A WiFi dongle on the LAN answers in well under a second and costs no cloud
+# quota, so it is polled often. When it stops answering the cloud takes over
+# and the dongle is tried again after the retry interval.
+LOCAL_POLL_INTERVAL = timedelta(seconds=10)
+LOCAL_RETRY_INTERVAL = timedelta(minutes=5)
+LOCAL_TIMEOUT = aiohttp.ClientTimeout(total=5)
+
+# Nowcasts are estimated this often between uploads, rounded to steps of W
+# far finer than their error, and written when that changes. Each upload's
+# clear-sky index, and the error learnt from it, are smoothed by these
+# weights; the error starts from a prior in W per square root of a minute
+# ahead.
+NOWCAST_INTERVAL = timedelta(seconds=5)
+NOWCAST_STEP = 10
+NOWCAST_INDEX_SMOOTHING = 0.5
+NOWCAST_ERROR_SMOOTHING = 0.1
+NOWCAST_PRIOR_ERROR = 50
+
+# History exports are read this many rows per executor job, and imported
+# into the recorder this many hours per meter at a time
+IMPORT_READ_ROWS = 1000
+IMPORT_BATCH_HOURS = 1000
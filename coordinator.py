@@ -0,0 +1,204 @@
+"""Single-flight data coordinator for a SolaxCloud inverter."""
+import asyncio
+import logging
+
+from homeassistant.core import callback
+
+from .const import DOMAIN
+from .snapshot import EMPTY_SNAPSHOT
+
+
+# Get the shared update batcher, creating it for the first inverter
+@callback
+def async_get_update_batcher(hass):
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    if 'update_batcher' not in domain_data:
+        domain_data['update_batcher'] = UpdateBatcher(hass)
+    return domain_data['update_batcher']
+
+
+class UpdateBatcher:
+    # Applies the entity updates due after fetches in one event loop callback,
+    # however many inverters were fetched in the same iteration of the loop.
+    # A callback queued several times runs once. Callbacks queued while the
+    # batch runs, like the fleet's, join it instead of waking the loop again.
+    def __init__(self, hass):
+        self.hass = hass
+        self.logger = logging.getLogger(__name__)
+        # Run callbacks straight away instead, one update at a time
+        self.immediate = False
+        self._pending = {}
+        self._handle = None
+
+    @callback
+    def async_schedule(self, update_callback):
+        if self.immediate:
+            update_callback()
+            return
+        self._pending[update_callback] = None
+        if self._handle is None:
+            self._handle = self.hass.loop.call_soon(self._async_flush)
+
+    # A failing callback is logged and the batch goes on: the others may
+    # include coordinators that would never be queued again
+    @callback
+    def _async_flush(self):
+        try:
+            while self._pending:
+                pending, self._pending = self._pending, {}
+                for update_callback in pending:
+                    try:
+                        update_callback()
+                    except Exception:
+                        self.logger.exception('Error applying a SolaxCloud update')
+        finally:
+            self._handle = None
+
+
+class SolaxCloudCoordinator:
+    # Owns the data of one SolaxCloud instance: at most one API call is in
+    # flight at any time and subscribed entities are pushed what changed.
+    # When to refresh is decided by the PollScheduler of the inverter's token.
+    def __init__(self, hass, solax_cloud):
+        self.hass = hass
+        self.logger = logging.getLogger(__name__)
+        self.solax_cloud = solax_cloud
+        # Entity callbacks keyed by the API item they display; callbacks
+        # under None want every update
+        self._listeners = {}
+        # Callbacks run after every fetch attempt, whatever its outcome
+        self._fetch_listeners = []
+        self._refresh_task = None
+        # Listener notifications waiting for the next batch: the changed
+        # items, None for every listener
+        self._batcher = async_get_update_batcher(hass)
+        self._queued = False
+        self._queued_changed = set()
+        # Rolling window over recent uploads, if enabled
+        self.history = None
+        # Energy counters integrated from the power readings
+        self.energy = None
+        # Hourly statistics imported into the recorder, if enabled
+        self.statistics = None
+        # Estimates of the current power between uploads, if enabled
+        self.nowcast = None
+
+    @property
+    def data(self):
+        return self.solax_cloud.snapshot
+
+    # Subscribe an entity to changes of one API item, or to every update
+    @callback
+    def async_add_listener(self, update_callback, key=None):
+        self._listeners.setdefault(key, []).append(update_callback)
+
+        @callback
+        def remove_listener():
+            self._listeners[key].remove(update_callback)
+
+        return remove_listener
+
+    # Subscribe to every fetch attempt, e.g. to report on polling itself
+    @callback
+    def async_add_fetch_listener(self, update_callback):
+        self._fetch_listeners.append(update_callback)
+
+        @callback
+        def remove_listener():
+            self._fetch_listeners.remove(update_callback)
+
+        return remove_listener
+
+    # Notify the listeners of the changed items, or everyone if not given
+    @callback
+    def async_update_listeners(self, changed=None):
+        # A callback listening to several of the changed items runs once
+        due = {}
+        for key, callbacks in list(self._listeners.items()):
+            if changed is None or key is None or key in changed:
+                due.update(dict.fromkeys(callbacks))
+        for update_callback in due:
+            update_callback()
+
+    # Fetch new data, coalescing concurrent callers onto the in-flight request.
+    # Returns whether the fetch succeeded.
+    async def async_refresh(self, now=None):
+        if self._refresh_task is None:
+            self._refresh_task = self.hass.async_create_background_task(
+                self._async_fetch(), f'{DOMAIN} refresh')
+        else:
+            self.solax_cloud.metrics.record_cache_hit()
+        # Shield so a cancelled caller cannot abort the fetch for the others
+        return await asyncio.shield(self._refresh_task)
+
+    async def _async_fetch(self):
+        previous = self.solax_cloud.snapshot
+        was_stale = self.solax_cloud.failures > 0
+        try:
+            success = await self.solax_cloud.async_get_data()
+        finally:
+            self._refresh_task = None
+        self._async_fetched(previous, was_stale, success)
+        return success
+
+    # Apply this inverter's share of a batch request made by the scheduler
+    @callback
+    def async_set_result(self, result, error=None, fetched_at=None):
+        return self._async_apply(
+            lambda: self.solax_cloud.set_result(result, error, fetched_at))
+
+    # Apply a raw API response replayed from a capture
+    @callback
+    def async_replay_response(self, data, latency, fetched_at):
+        return self._async_apply(
+            lambda: self.solax_cloud.handle_response(data, latency, fetched_at))
+
+    @callback
+    def _async_apply(self, apply):
+        previous = self.solax_cloud.snapshot
+        was_stale = self.solax_cloud.failures > 0
+        success = apply()
+        self._async_fetched(previous, was_stale, success)
+        return success
+
+    @callback
+    def _async_fetched(self, previous, was_stale, success):
+        if not success:
+            # Entities keep showing the last good data during an outage; they
+            # are only written again to flag it as stale when the outage starts
+            changed = None if self.solax_cloud.failures == 1 else set()
+        elif was_stale or previous is EMPTY_SNAPSHOT:
+            changed = None
+        else:
+            changed = self._changed_fields(previous, self.solax_cloud.snapshot)
+        self._async_queue_update(changed)
+
+    # Only the entities whose value changed since the previous snapshot are
+    # written
+    @staticmethod
+    def _changed_fields(previous, snapshot):
+        # Same upload: the inverter has not reported anything new
+        if snapshot.uploadTime == previous.uploadTime:
+            return set()
+        return {field for field, old, new in zip(snapshot._fields, previous, snapshot)
+                if old != new}
+
+    # Merge the notifications of a fetch into those waiting for the batch
+    @callback
+    def _async_queue_update(self, changed):
+        if not self._queued:
+            self._queued = True
+            self._queued_changed = changed
+            self._batcher.async_schedule(self._async_flush_update)
+        elif self._queued_changed is not None:
+            self._queued_changed = None if changed is None else self._queued_changed | changed
+
+    @callback
+    def _async_flush_update(self):
+        changed = self._queued_changed
+        self._queued = False
+        self._queued_changed = set()
+        for update_callback in list(self._fetch_listeners):
+            update_callback()
+        if changed is None or changed:
+            self.async_update_listeners(changed)
@@ -0,0 +1,95 @@
+"""Energy counters integrated from an inverter's instantaneous power."""
+from datetime import datetime, timedelta
+
+from homeassistant.helpers.storage import Store
+
+from .const import DOMAIN, MAX_INTEGRATION_GAP, STORAGE_SAVE_DELAY, STORAGE_VERSION
+
+# Counters kept for every inverter, in kWh
+ENERGY_COUNTERS = ('battery_charge', 'battery_discharge', 'pv_energy', 'self_consumption')
+
+
+# Power behind each counter in W, or None where the snapshot lacks it. The
+# battery power is signed: positive while charging, negative discharging.
+def _powers(snapshot):
+    dc = [power for power in (snapshot.powerdc1, snapshot.powerdc2,
+                              snapshot.powerdc3, snapshot.powerdc4)
+          if power is not None]
+    self_consumption = None
+    if snapshot.acpower is not None and snapshot.feedinpower is not None:
+        # Inverter output not exported to the grid
+        self_consumption = max(snapshot.acpower - max(snapshot.feedinpower, 0), 0)
+    return {
+        'battery': snapshot.batpower,
+        'pv_energy': sum(dc) if dc else None,
+        'self_consumption': self_consumption,
+    }
+
+
+# Trapezoid between two power readings over `hours`, as the energy above and
+# below zero in kWh. A sign change is split where the line crosses zero.
+def _trapezoid(start, end, hours):
+    if start >= 0 and end >= 0:
+        return (start + end) / 2 * hours / 1000, 0.0
+    if start <= 0 and end <= 0:
+        return 0.0, -(start + end) / 2 * hours / 1000
+    crossing = start / (start - end) * hours
+    if start > 0:
+        return start / 2 * crossing / 1000, -end / 2 * (hours - crossing) / 1000
+    return end / 2 * (hours - crossing) / 1000, -start / 2 * crossing / 1000
+
+
+class EnergyIntegrator:
+    # Integrates every counter in one pass over each new upload, by the
+    # trapezoidal rule between consecutive uploadTimes. Counters only ever
+    # grow. Across a gap longer than MAX_INTEGRATION_GAP the power in between
+    # is unknown, so nothing is added and integration restarts from the new
+    # upload. Totals and the last upload are persisted, so a restart within
+    # the gap carries on where it left off.
+    def __init__(self, hass, sn):
+        self.totals = dict.fromkeys(ENERGY_COUNTERS, 0.0)
+        self.last_upload = None
+        self._last_powers = None
+        self.store = Store(hass, STORAGE_VERSION, f'{DOMAIN}.{sn}.energy')
+
+    async def async_restore(self):
+        stored = await self.store.async_load()
+        if stored:
+            self.totals.update(stored['totals'])
+            if stored['last_upload'] is not None:
+                self.last_upload = datetime.fromisoformat(stored['last_upload'])
+                self._last_powers = stored['last_powers']
+
+    def _data_to_store(self):
+        return {'totals': self.totals,
+                'last_upload': self.last_upload and self.last_upload.isoformat(),
+                'last_powers': self._last_powers}
+
+    # Account for a snapshot. Returns whether any counter grew.
+    def update(self, snapshot):
+        upload_time = snapshot.upload_time
+        if upload_time is None or upload_time == self.last_upload:
+            return False
+        powers = _powers(snapshot)
+        grew = False
+        # An upload from before the last one means the inverter's clock was
+        # reset; like a gap, it restarts integration
+        elapsed = upload_time - self.last_upload if self.last_upload else None
+        if elapsed is not None and timedelta(0) < elapsed <= MAX_INTEGRATION_GAP:
+            hours = elapsed.total_seconds() / 3600
+            for key, power in powers.items():
+                previous = self._last_powers.get(key)
+                if power is None or previous is None:
+                    continue
+                positive, negative = _trapezoid(previous, power, hours)
+                if key == 'battery':
+                    self.totals['battery_charge'] += positive
+                    self.totals['battery_discharge'] += negative
+                    grew = grew or bool(positive or negative)
+                else:
+                    self.totals[key] += positive
+                    grew = grew or bool(positive)
+        self.last_upload = upload_time
+        self._last_powers = powers
+        self.store.async_delay_save(self._data_to_store, STORAGE_SAVE_DELAY)
+        return grew
@@ -0,0 +1,97 @@
+"""Fleet-wide aggregates across every SolaxCloud inverter."""
+from homeassistant.core import callback
+
+from .const import DOMAIN
+from .coordinator import async_get_update_batcher
+
+# API items summed over the fleet; the SoC is averaged weighted by capacity
+FLEET_SUM_KEYS = ('yieldtotal', 'yieldtoday', 'feedinpower', 'batpower')
+
+
+# Get the fleet aggregate, creating it for the first inverter
+@callback
+def async_get_fleet(hass):
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    if 'fleet' not in domain_data:
+        domain_data['fleet'] = SolaxCloudFleet(async_get_update_batcher(hass))
+    return domain_data['fleet']
+
+
+class SolaxCloudFleet:
+    # Keeps every aggregate as a running total. When an inverter's snapshot
+    # arrives only the difference to its previous contribution is applied,
+    # so an update costs the same however large the fleet is. Entities are
+    # written once per batch of updates rather than once per inverter.
+    def __init__(self, batcher):
+        self.batcher = batcher
+        self.totals = dict.fromkeys(FLEET_SUM_KEYS, 0.0)
+        # Sum of SoC times capacity, and the capacity reporting a SoC
+        self.soc_weighted = 0.0
+        self.soc_capacity = 0.0
+        self.inverters = 0
+        self.entities_added = False
+        # Hourly statistics imported into the recorder, if enabled
+        self.statistics = None
+        self._contributions = {}
+        self._listeners = {}
+
+    @property
+    def soc(self):
+        if not self.soc_capacity:
+            return None
+        return self.soc_weighted / self.soc_capacity
+
+    # Add an inverter whose battery holds `capacity` kWh (weights its SoC)
+    @callback
+    def async_add_inverter(self, coordinator, capacity):
+        self.inverters += 1
+
+        @callback
+        def update():
+            self._async_update_inverter(coordinator, capacity)
+
+        update()
+        return coordinator.async_add_listener(update)
+
+    @callback
+    def _async_update_inverter(self, coordinator, capacity):
+        snapshot = coordinator.data
+        previous = self._contributions.get(coordinator, {})
+        # An item missing from an upload keeps its last contribution, so the
+        # yields do not drop by the inverter's share for that upload
+        contribution = {}
+        for key in self.totals:
+            value = getattr(snapshot, key)
+            contribution[key] = previous.get(key, 0.0) if value is None else value
+        soc = snapshot.soc
+        contribution['soc'] = (soc * capacity, capacity) if soc is not None else (0.0, 0.0)
+
+        changed = set()
+        for key in self.totals:
+            delta = contribution[key] - previous.get(key, 0.0)
+            if delta:
+                self.totals[key] += delta
+                changed.add(key)
+        weighted, reporting = contribution['soc']
+        previous_weighted, previous_reporting = previous.get('soc', (0.0, 0.0))
+        if (weighted, reporting) != (previous_weighted, previous_reporting):
+            self.soc_weighted += weighted - previous_weighted
+            self.soc_capacity += reporting - previous_reporting
+            changed.add('soc')
+        self._contributions[coordinator] = contribution
+
+        for key in changed:
+            for update_callback in list(self._listeners.get(key, ())):
+                self.batcher.async_schedule(update_callback)
+
+    # Subscribe an entity to changes of one aggregate
+    @callback
+    def async_add_listener(self, update_callback, key):
+        self._listeners.setdefault(key, []).append(update_callback)
+
+        @callback
+        def remove_listener():
+            self._listeners[key].remove(update_callback)
+
+        return remove_listener
+
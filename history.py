@@ -0,0 +1,119 @@
+"""Fixed-size history of recent readings with rolling statistics."""
+import math
+
+from array import array
+from collections import deque
+
+from .snapshot import NUMERIC_FIELDS
+
+NAN = float('nan')
+
+
+class RingBuffer:
+    # The last `size` samples of one field in a preallocated array. The sum
+    # is kept running and min/max come from monotonic deques of sample
+    # numbers, so every statistic costs O(1) (amortized) per new sample.
+    # Missing samples are stored as NaN and left out of the statistics.
+    __slots__ = ('size', 'values', 'count', 'total', 'valid', '_min', '_max')
+
+    def __init__(self, size):
+        self.size = size
+        self.values = array('d', [NAN]) * size
+        self.count = 0
+        self.total = 0.0
+        self.valid = 0
+        self._min = deque()
+        self._max = deque()
+
+    def append(self, value):
+        value = NAN if value is None else float(value)
+        evicted = self.count - self.size
+        if evicted >= 0:
+            old = self.values[evicted % self.size]
+            if not math.isnan(old):
+                self.total -= old
+                self.valid -= 1
+            if self._min and self._min[0] == evicted:
+                self._min.popleft()
+            if self._max and self._max[0] == evicted:
+                self._max.popleft()
+        self.values[self.count % self.size] = value
+        if not math.isnan(value):
+            self.total += value
+            self.valid += 1
+            while self._min and self.values[self._min[-1] % self.size] >= value:
+                self._min.pop()
+            self._min.append(self.count)
+            while self._max and self.values[self._max[-1] % self.size] <= value:
+                self._max.pop()
+            self._max.append(self.count)
+        self.count += 1
+        # Re-add the window now and then so float error in the running sum
+        # cannot build up over months of uptime
+        if not self.count % (self.size * 64):
+            valid = [v for v in self.values if not math.isnan(v)]
+            self.total = math.fsum(valid)
+
+    def _at(self, number):
+        return self.values[number % self.size]
+
+    @property
+    def newest(self):
+        return self._at(self.count - 1) if self.count else NAN
+
+    @property
+    def oldest(self):
+        return self._at(max(self.count - self.size, 0)) if self.count else NAN
+
+    @property
+    def mean(self):
+        return self.total / self.valid if self.valid else None
+
+    @property
+    def min(self):
+        return self._at(self._min[0]) if self._min else None
+
+    @property
+    def max(self):
+        return self._at(self._max[0]) if self._max else None
+
+
+class InverterHistory:
+    # Rolling window over the last `size` uploads of an inverter's numeric
+    # fields. Memory is fixed from the start however long it runs.
+    def __init__(self, size):
+        self.size = size
+        self.times = RingBuffer(size)
+        self.fields = {field: RingBuffer(size) for field in NUMERIC_FIELDS}
+        self._last_upload = None
+
+    # Record a snapshot, once per upload
+    def append(self, snapshot):
+        moment = snapshot.upload_time or snapshot.fetched_at
+        if moment is None or moment == self._last_upload:
+            return
+        self._last_upload = moment
+        self.times.append(moment.timestamp())
+        for field, buffer in self.fields.items():
+            buffer.append(getattr(snapshot, field))
+
+    # Change per hour between the oldest and newest sample in the window
+    def rate(self, field):
+        buffer = self.fields[field]
+        elapsed = self.times.newest - self.times.oldest
+        change = buffer.newest - buffer.oldest
+        if not elapsed or math.isnan(change):
+            return None
+        return change / elapsed * 3600
+
+    def stats(self, field):
+        buffer = self.fields[field]
+        if not buffer.valid:
+            return None
+        rate = self.rate(field)
+        return {
+            'mean': round(buffer.mean, 2),
+            'min': buffer.min,
+            'max': buffer.max,
+            'rate_per_hour': None if rate is None else round(rate, 2),
+        }
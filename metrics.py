@@ -0,0 +1,150 @@
+"""Fetch instrumentation for the SolaxCloud Component."""
+import bisect
+import time
+
+from collections import Counter, deque
+
+from aiohttp import web
+
+from homeassistant.components.http import HomeAssistantView
+from homeassistant.util import dt as dt_util
+
+from .const import API_RATE_LIMIT, API_RATE_PERIOD, DOMAIN
+
+# Upper bounds of the request latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class Histogram:
+    # Fixed-bucket histogram, cumulative on export like Prometheus expects
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    # (upper bound, cumulative count) pairs, ending with +Inf
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            yield bound, total
+
+
+class FetchMetrics:
+    # Polling cost of one inverter
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.last_latency = None
+        self.requests = 0
+        self.successes = 0
+        self.errors = Counter()
+        # Refreshes served without an API call: coalesced onto a request in
+        # flight, or skipped because cached data was still fresh
+        self.cache_hits = 0
+        self._recent_requests = deque()
+
+    # Requests to a local dongle do not count against the token's budget
+    def record_request(self, latency, error_type=None, local=False):
+        self.latency.observe(latency)
+        self.last_latency = latency
+        self.requests += 1
+        if not local:
+            self._recent_requests.append(time.monotonic())
+        if error_type is None:
+            self.successes += 1
+        else:
+            self.errors[error_type] += 1
+
+    def record_cache_hit(self):
+        self.cache_hits += 1
+
+    # API calls made within the API's rate limit period
+    def recent_requests(self):
+        horizon = time.monotonic() - API_RATE_PERIOD.total_seconds()
+        while self._recent_requests and self._recent_requests[0] < horizon:
+            self._recent_requests.popleft()
+        return len(self._recent_requests)
+
+
+# Calls a token has used of its budget within the rate limit period
+def token_calls(scheduler):
+    return sum(coordinator.solax_cloud.metrics.recent_requests()
+               for coordinator in scheduler.coordinators)
+
+
+# Seconds since the inverter uploaded the data currently held
+def data_age(solax_cloud):
+    upload_time = solax_cloud.snapshot.upload_time
+    if upload_time is None:
+        return None
+    return (dt_util.now().replace(tzinfo=None) - upload_time).total_seconds()
+
+
+# Render every inverter's metrics in the Prometheus text exposition format
+def render_prometheus(hass):
+    schedulers = hass.data.get(DOMAIN, {}).get('schedulers', {})
+    lines = []
+
+    def metric(name, kind, description):
+        lines.append(f'# HELP solaxcloud_{name} {description}')
+        lines.append(f'# TYPE solaxcloud_{name} {kind}')
+
+    def inverters():
+        for scheduler in schedulers.values():
+            for coordinator in scheduler.coordinators:
+                solax_cloud = coordinator.solax_cloud
+                yield f'sn="{solax_cloud.sn}"', solax_cloud
+
+    metric('request_duration_seconds', 'histogram', 'SolaxCloud API request latency')
+    for labels, solax_cloud in inverters():
+        histogram = solax_cloud.metrics.latency
+        for bound, count in histogram.cumulative():
+            le = '+Inf' if bound == float('inf') else bound
+            lines.append(f'solaxcloud_request_duration_seconds_bucket{{{labels},le="{le}"}} {count}')
+        lines.append(f'solaxcloud_request_duration_seconds_sum{{{labels}}} {histogram.sum}')
+        lines.append(f'solaxcloud_request_duration_seconds_count{{{labels}}} {histogram.count}')
+
+    metric('requests_total', 'counter', 'SolaxCloud API requests made')
+    for labels, solax_cloud in inverters():
+        lines.append(f'solaxcloud_requests_total{{{labels}}} {solax_cloud.metrics.requests}')
+
+    metric('request_errors_total', 'counter', 'Failed SolaxCloud API requests by error type')
+    for labels, solax_cloud in inverters():
+        for error_type, count in solax_cloud.metrics.errors.items():
+            lines.append(f'solaxcloud_request_errors_total{{{labels},type="{error_type}"}} {count}')
+
+    metric('cache_hits_total', 'counter', 'Refreshes served without an API request')
+    for labels, solax_cloud in inverters():
+        lines.append(f'solaxcloud_cache_hits_total{{{labels}}} {solax_cloud.metrics.cache_hits}')
+
+    metric('data_age_seconds', 'gauge', 'Time since the inverter uploaded the current data')
+    for labels, solax_cloud in inverters():
+        age = data_age(solax_cloud)
+        if age is not None:
+            lines.append(f'solaxcloud_data_age_seconds{{{labels}}} {age:.0f}')
+
+    # Tokens are secrets, only their last characters identify them here
+    metric('token_calls', 'gauge', 'API calls made on a token within the rate limit period')
+    for api_key, scheduler in schedulers.items():
+        lines.append(f'solaxcloud_token_calls{{token="...{api_key[-4:]}"}} {token_calls(scheduler)}')
+    metric('token_call_limit', 'gauge', 'API calls allowed on a token within the rate limit period')
+    for api_key in schedulers:
+        lines.append(f'solaxcloud_token_call_limit{{token="...{api_key[-4:]}"}} {API_RATE_LIMIT}')
+
+    return '\n'.join(lines) + '\n'
+
+
+class SolaxCloudMetricsView(HomeAssistantView):
+    # Prometheus scrape target, behind Home Assistant's authentication
+    url = '/api/solaxcloud/metrics'
+    name = 'api:solaxcloud:metrics'
+
+    async def get(self, request):
+        return web.Response(text=render_prometheus(request.app['hass']),
+                            content_type='text/plain')
@@ -0,0 +1,172 @@
+"""Short-horizon power nowcasts of an inverter between uploads."""
+import math
+
+from homeassistant.core import callback
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.util import dt as dt_util
+
+from .const import (
+    DOMAIN,
+    MAX_INTEGRATION_GAP,
+    NOWCAST_ERROR_SMOOTHING,
+    NOWCAST_INDEX_SMOOTHING,
+    NOWCAST_INTERVAL,
+    NOWCAST_PRIOR_ERROR,
+)
+
+# Powers nowcast, in W
+NOWCAST_FIELDS = ('acpower', 'feedinpower', 'batpower')
+
+# Below this sine of the sun's elevation, about 3 degrees, PV output is too
+# small and diffuse to scale with the sun
+MIN_SUN = 0.05
+
+# Power the expected error is compared with to give the confidence, at least
+MIN_REFERENCE_POWER = 100
+
+
+# Sine of the sun's elevation at `when` (UTC), 0 while it is below the
+# horizon. A few trigonometric functions: accurate to well under a degree,
+# which is plenty to scale PV output by.
+def sun_height(when, latitude, longitude):
+    day = when.timetuple().tm_yday
+    declination = math.radians(23.44) * math.sin(2 * math.pi * (284 + day) / 365)
+    angle = 2 * math.pi * (day - 81) / 364
+    # Equation of time in minutes: sundial ahead of the clock
+    equation_of_time = (9.87 * math.sin(2 * angle) - 7.53 * math.cos(angle)
+                        - 1.5 * math.sin(angle))
+    solar_hours = (when.hour + when.minute / 60 + when.second / 3600
+                   + longitude / 15 + equation_of_time / 60)
+    hour_angle = math.radians(15 * (solar_hours - 12))
+    latitude = math.radians(latitude)
+    height = (math.sin(latitude) * math.sin(declination)
+              + math.cos(latitude) * math.cos(declination) * math.cos(hour_angle))
+    return max(height, 0.0)
+
+
+class PowerNowcast:
+    # Estimates the current AC, grid and battery power of an inverter from
+    # its last uploads. The AC output follows the sun: its output relative to
+    # the sun's height (the clear-sky index), smoothed over the last uploads,
+    # is scaled by the sun's height now. The household load and battery
+    # power are held, and the grid power is what remains of the AC output.
+    # Each new upload is first compared with the estimate for its time, and
+    # the error learnt per square root of a minute ahead, like a random walk.
+    # The confidence compares the error expected by now with the power of the
+    # site. Everything is O(1).
+    def __init__(self, latitude, longitude):
+        self.latitude = latitude
+        self.longitude = longitude
+        # Time of the last upload (UTC) and what it reported
+        self.observed_at = None
+        self._acpower = None
+        self._load = None
+        self._batpower = None
+        self._sun = 0.0
+        # Clear-sky index, smoothed over the last uploads
+        self._index = None
+        # Mean absolute error in W per square root of a minute ahead
+        self.error_rate = NOWCAST_PRIOR_ERROR
+
+    @property
+    def ready(self):
+        return self.observed_at is not None
+
+    # Learn from a new upload. Returns whether it was new.
+    def update(self, snapshot):
+        upload_time = snapshot.upload_time
+        if upload_time is None or snapshot.acpower is None or snapshot.feedinpower is None:
+            return False
+        observed_at = dt_util.as_utc(upload_time.replace(tzinfo=dt_util.DEFAULT_TIME_ZONE))
+        if self.observed_at is not None and observed_at <= self.observed_at:
+            return False
+        batpower = snapshot.batpower or 0.0
+        elapsed = None if self.observed_at is None else observed_at - self.observed_at
+
+        if elapsed is not None and elapsed <= MAX_INTEGRATION_GAP:
+            estimate = self.estimate(observed_at)
+            error = (abs(estimate['acpower'] - snapshot.acpower)
+                     + abs(estimate['feedinpower'] - snapshot.feedinpower)
+                     + abs(estimate['batpower'] - batpower)) / len(NOWCAST_FIELDS)
+            rate = error / math.sqrt(elapsed.total_seconds() / 60)
+            self.error_rate += NOWCAST_ERROR_SMOOTHING * (rate - self.error_rate)
+
+        sun = sun_height(observed_at, self.latitude, self.longitude)
+        index = snapshot.acpower / sun if sun >= MIN_SUN else None
+        if (index is not None and self._index is not None
+                and elapsed is not None and elapsed <= MAX_INTEGRATION_GAP):
+            index = self._index + NOWCAST_INDEX_SMOOTHING * (index - self._index)
+
+        self.observed_at = observed_at
+        self._acpower = snapshot.acpower
+        self._load = snapshot.acpower - snapshot.feedinpower - batpower
+        self._batpower = batpower
+        self._sun = sun
+        self._index = index
+        return True
+
+    # Estimated powers at `when` (UTC), by field
+    def estimate(self, when):
+        acpower = self._acpower
+        sun = sun_height(when, self.latitude, self.longitude)
+        if self._index is not None and sun >= MIN_SUN:
+            acpower = max(self._index, 0.0) * sun
+        elif sun < MIN_SUN <= self._sun:
+            # The sun has set since
+            acpower = 0.0
+        return {
+            'acpower': acpower,
+            'feedinpower': acpower - self._load - self._batpower,
+            'batpower': self._batpower,
+        }
+
+    # Power of the site that errors are relative to
+    @property
+    def reference_power(self):
+        return max(abs(self._acpower), abs(self._load), MIN_REFERENCE_POWER)
+
+    # Confidence in an estimate at `when`, from 0 to 1
+    def confidence(self, when):
+        minutes = max((when - self.observed_at).total_seconds(), 0) / 60
+        expected_error = self.error_rate * math.sqrt(minutes)
+        reference = self.reference_power
+        return reference / (reference + expected_error)
+
+
+# Get the shared ticker, creating it for the first nowcast
+@callback
+def async_get_nowcast_ticker(hass):
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    if 'nowcast_ticker' not in domain_data:
+        domain_data['nowcast_ticker'] = NowcastTicker(hass)
+    return domain_data['nowcast_ticker']
+
+
+class NowcastTicker:
+    # Writes every nowcast entity from one timer, rather than one timer per
+    # entity. The timer only runs while there are entities.
+    def __init__(self, hass):
+        self.hass = hass
+        self._callbacks = []
+        self._unsubscribe = None
+
+    @callback
+    def async_add_listener(self, update_callback):
+        self._callbacks.append(update_callback)
+        if self._unsubscribe is None:
+            self._unsubscribe = async_track_time_interval(
+                self.hass, self._async_tick, NOWCAST_INTERVAL)
+
+        @callback
+        def remove_listener():
+            self._callbacks.remove(update_callback)
+            if not self._callbacks and self._unsubscribe is not None:
+                self._unsubscribe()
+                self._unsubscribe = None
+
+        return remove_listener
+
+    @callback
+    def _async_tick(self, now):
+        for update_callback in list(self._callbacks):
+            update_callback()
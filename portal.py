@@ -0,0 +1,243 @@
+"""Import of SolaxCloud portal history exports into long-term statistics."""
+import csv
+import logging
+import re
+import zipfile
+
+from datetime import date, datetime, time
+
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.util import dt as dt_util
+
+from .const import DOMAIN, IMPORT_BATCH_HOURS, IMPORT_READ_ROWS
+from .statistics import utc_hour
+
+_LOGGER = logging.getLogger(__name__)
+
+# Column headings of the exports by the item they hold, normalised: lower
+# case letters and digits only, units in brackets left out. The API's own
+# names are accepted too.
+COLUMNS = {
+    'sn': ('sn', 'invertersn', 'inverterserialnumber', 'serialnumber', 'registrationno'),
+    'time': ('time', 'date', 'updatetime', 'uploadtime'),
+    'yieldtotal': ('yieldtotal', 'totalyield'),
+    'feedinenergy': ('feedinenergy', 'totalfeedinenergy', 'exportedenergy'),
+    'consumeenergy': ('consumeenergy', 'consumedenergy', 'totalconsumedenergy',
+                      'importedenergy'),
+}
+METERS = ('yieldtotal', 'feedinenergy', 'consumeenergy')
+
+# Rows searched for the headings, below any title the export starts with
+MAX_HEADER_ROW = 10
+
+# A number written with a decimal comma, its thousands grouped by dots or not
+DECIMAL_COMMA = re.compile(r'[+-]?(?:\d{1,3}(?:\.\d{3})+|\d+),\d+')
+
+
+def _normalise(heading):
+    heading = re.sub(r'\(.*?\)', '', str(heading or '')).lower()
+    return re.sub(r'[^a-z0-9]', '', heading)
+
+
+# Where each item is in a row, or None if the row is not the headings
+def _columns(row):
+    headings = [_normalise(cell) for cell in row]
+    columns = {}
+    for item, names in COLUMNS.items():
+        for index, heading in enumerate(headings):
+            if heading in names:
+                columns[item] = index
+                break
+    if 'time' not in columns or not any(meter in columns for meter in METERS):
+        return None
+    return columns
+
+
+# A time in the export, on the inverter's clock. A date alone is a daily
+# reading, taken at the end of the day.
+def _parse_time(value):
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None)
+    if isinstance(value, date):
+        return datetime.combine(value, time(23))
+    value = str(value or '').strip()
+    parsed = dt_util.parse_datetime(value)
+    if parsed is not None:
+        return parsed.replace(tzinfo=None)
+    parsed = dt_util.parse_date(value)
+    return None if parsed is None else datetime.combine(parsed, time(23))
+
+
+def _parse_number(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    try:
+        return float(str(value).strip())
+    except ValueError:
+        return None
+
+
+# The rows of a CSV or XLSX file, read lazily so that only the rows being
+# imported are ever in memory. Runs in the executor.
+def _open_rows(path):
+    if path.lower().endswith('.xlsx'):
+        return _xlsx_rows(path)
+    return _csv_rows(path)
+
+
+def _csv_rows(path):
+    with open(path, newline='', encoding='utf-8-sig') as file:
+        try:
+            dialect = csv.Sniffer().sniff(file.read(4096), delimiters=',;\t')
+        except csv.Error:
+            dialect = csv.excel
+        file.seek(0)
+        rows = csv.reader(file, dialect)
+        if dialect.delimiter == ',':
+            yield from rows
+            return
+        # Exports not separated by commas may be from a locale writing
+        # decimal commas
+        for row in rows:
+            yield [_decimal_point(cell) for cell in row]
+
+
+def _decimal_point(cell):
+    if DECIMAL_COMMA.fullmatch(cell.strip()):
+        return cell.replace('.', '').replace(',', '.')
+    return cell
+
+
+def _xlsx_rows(path):
+    # Only needed for XLSX exports
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def _next_rows(rows, count):
+    return [row for _, row in zip(range(count), rows)]
+
+
+# Import the meter readings of a portal export at `path`, relative to the
+# config directory, into the hourly statistics of the inverters they belong
+# to. Exports without a serial number column are taken to be of `sn`.
+# Returns the number of hourly statistics imported.
+async def async_import_history(hass, path, sn=None):
+    # Like other services reading files, only from the allowed directories
+    full_path = hass.config.path(path)
+    if not await hass.async_add_executor_job(hass.config.is_allowed_path, full_path):
+        raise HomeAssistantError(
+            f'Cannot read SolaxCloud history export {path}: it is not in a directory '
+            f'of allowlist_external_dirs')
+    history_import = HistoryImport(hass.data.get(DOMAIN, {}).get('statistics', {}), sn)
+    try:
+        rows = await hass.async_add_executor_job(_open_rows, full_path)
+        try:
+            while batch := await hass.async_add_executor_job(_next_rows, rows, IMPORT_READ_ROWS):
+                for row in batch:
+                    history_import.add(row)
+        finally:
+            await hass.async_add_executor_job(rows.close)
+    except (OSError, ValueError, csv.Error, zipfile.BadZipFile, ImportError) as e:
+        raise HomeAssistantError(f'Cannot read SolaxCloud history export {path}: {e}') from e
+    history_import.flush()
+    unread = [sn for sn, readings in history_import.readings.items() if not readings]
+    if unread:
+        _LOGGER.warning(
+            f'SolaxCloud history of {", ".join(sorted(unread))} in {path} has no meter '
+            f'readings that could be read, check the time and energy columns')
+    if history_import.skipped:
+        _LOGGER.warning(
+            f'SolaxCloud history of {", ".join(sorted(history_import.skipped))} in {path} '
+            f'was not imported: statistics are not enabled for them or they have not '
+            f'uploaded since')
+    _LOGGER.info(f'Imported {history_import.imported} hourly statistics of SolaxCloud '
+                 f'history from {path}')
+    return history_import.imported
+
+
+class HistoryImport:
+    # Turns export rows into hourly meter readings, the last reading of each
+    # hour, and hands them to the inverter's statistics in batches. Besides
+    # the batches, only the hour in progress of each inverter is held, however
+    # large the export. Rows are expected in time order per inverter.
+    def __init__(self, statistics, sn=None):
+        self.statistics = statistics
+        self.sn = sn
+        self.columns = None
+        self.imported = 0
+        self.skipped = set()
+        # Serial number: meter readings read of an inverter being imported
+        self.readings = {}
+        self._rows_read = 0
+        # Serial number: hour in progress and its readings
+        self._hours = {}
+        # (Serial number, meter): readings waiting for the next batch
+        self._pending = {}
+
+    def add(self, row):
+        if not any(row):
+            return
+        self._rows_read += 1
+        if self.columns is None:
+            self.columns = _columns(row)
+            if self.columns is None and self._rows_read >= MAX_HEADER_ROW:
+                raise HomeAssistantError(
+                    'No time and yield or energy columns in the SolaxCloud history export')
+            if self.columns is not None and 'sn' not in self.columns and self.sn is None:
+                raise HomeAssistantError(
+                    'The SolaxCloud history export has no serial number column, give the sn')
+            return
+
+        sn = str(self._cell(row, 'sn')).strip() if 'sn' in self.columns else self.sn
+        if self.sn is not None and sn != self.sn:
+            return
+        statistics = self.statistics.get(sn)
+        if statistics is None or statistics.hour is None:
+            self.skipped.add(sn)
+            return
+        self.readings.setdefault(sn, 0)
+        upload_time = _parse_time(self._cell(row, 'time'))
+        if upload_time is None:
+            return
+
+        hour = utc_hour(upload_time)
+        current = self._hours.get(sn)
+        if current is None or current[0] != hour:
+            if current is not None:
+                self._close_hour(sn, *current)
+            current = self._hours[sn] = (hour, {})
+        for meter in METERS:
+            if meter in self.columns:
+                reading = _parse_number(self._cell(row, meter))
+                if reading is not None:
+                    current[1][meter] = reading
+                    self.readings[sn] += 1
+
+    def _cell(self, row, item):
+        index = self.columns[item]
+        return row[index] if index < len(row) else None
+
+    def _close_hour(self, sn, hour, readings):
+        for meter, reading in readings.items():
+            pending = self._pending.setdefault((sn, meter), [])
+            pending.append((hour, reading))
+            if len(pending) >= IMPORT_BATCH_HOURS:
+                self._import(sn, meter)
+
+    def _import(self, sn, meter):
+        self.imported += self.statistics[sn].import_meter(
+            sn, meter, self._pending.pop((sn, meter)))
+
+    # Import what is left once the whole export was read
+    def flush(self):
+        for sn, current in self._hours.items():
+            self._close_hour(sn, *current)
+        self._hours = {}
+        for sn, meter in list(self._pending):
+            self._import(sn, meter)
@@ -0,0 +1,423 @@
+"""Account-wide poll scheduling for inverters sharing a SolaxCloud token."""
+import asyncio
+import logging
+import math
+import random
+import time
+
+import aiohttp
+
+from collections import deque
+from datetime import timedelta
+
+from homeassistant.core import callback
+from homeassistant.helpers.event import async_call_later
+from homeassistant.util import dt as dt_util
+
+from .const import (
+    API_RATE_HEADROOM,
+    API_RATE_LIMIT,
+    API_RATE_PERIOD,
+    BACKOFF_MAX,
+    BATCH_SIZE,
+    CIRCUIT_COOLDOWN,
+    CIRCUIT_FAILURE_THRESHOLD,
+    DOMAIN,
+    LOCAL_POLL_INTERVAL,
+    MIN_TIME_BETWEEN_UPDATES,
+    SLEEP_POLL_INTERVAL,
+    SLEEP_STATUS_CODES,
+    UPLOAD_GRACE,
+)
+from .snapshot import EMPTY_SNAPSHOT
+
+# Consecutive polls without a new upload before the learned phase is dropped
+MAX_UPLOAD_MISSES = 3
+
+# Period samples, within this fraction of the shortest, needed before the
+# period is trusted. A single sample may span a night or an outage.
+MIN_PERIOD_SAMPLES = 2
+PERIOD_TOLERANCE = 0.1
+
+# Fractional part of the golden ratio: multiples of it spread newly registered
+# inverters evenly over the interval, whatever the final fleet size
+GOLDEN_FRACTION = (math.sqrt(5) - 1) / 2
+
+
+# Get the scheduler of an API token, creating it for the first inverter
+@callback
+def async_get_scheduler(hass, api_key):
+    schedulers = hass.data.setdefault(DOMAIN, {}).setdefault('schedulers', {})
+    if api_key not in schedulers:
+        schedulers[api_key] = PollScheduler(hass, api_key)
+    return schedulers[api_key]
+
+
+class CallWindow:
+    # At most `limit` calls in any `period` seconds, like the API counts them:
+    # a log of the calls made within the last period. Unlike a token bucket,
+    # a burst at the start of one minute cannot be followed by the refill in
+    # the same minute.
+    def __init__(self, limit, period):
+        self.limit = limit
+        self.period = period
+        self.calls = deque()
+
+    # Take one call from the budget. Returns 0 on success, otherwise the number
+    # of seconds until a call will be available.
+    def try_consume(self, now=None):
+        now = time.monotonic() if now is None else now
+        while self.calls and self.calls[0] <= now - self.period:
+            self.calls.popleft()
+        if len(self.calls) < self.limit:
+            self.calls.append(now)
+            return 0
+        return self.calls[0] + self.period - now
+
+
+class CircuitBreaker:
+    # Stops a token's fleet from hammering the API during a cloud outage.
+    # Closed: requests flow. Open: requests are refused until the cooldown
+    # ends. Then one probe is let through; its failure reopens the circuit
+    # with a doubled cooldown, its success closes it.
+    def __init__(self, threshold, cooldown, max_cooldown):
+        self.threshold = threshold
+        self.base_cooldown = cooldown.total_seconds()
+        self.max_cooldown = max_cooldown.total_seconds()
+        self.cooldown = self.base_cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    # Seconds until the circuit lets a probe through
+    def remaining(self, now=None):
+        if self.opened_at is None:
+            return 0
+        now = time.monotonic() if now is None else now
+        return max(0, self.opened_at + self.cooldown - now)
+
+    def allow(self, now=None):
+        if self.opened_at is None:
+            return True
+        if self.probing or self.remaining(now) > 0:
+            return False
+        self.probing = True
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.cooldown = self.base_cooldown
+
+    def record_failure(self, now=None):
+        now = time.monotonic() if now is None else now
+        self.failures += 1
+        if self.probing:
+            self.probing = False
+            self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+            self.opened_at = now
+        elif self.opened_at is None and self.failures >= self.threshold:
+            self.opened_at = now
+
+
+class UploadPhase:
+    # Learns an inverter's upload cadence from the uploadTime values it reports.
+    # Both the period and the lag between the inverter's clock and ours are the
+    # minimum of recent samples: skipped uploads and slow fetches only ever make
+    # a sample larger, and the lag absorbs any timezone difference. Polls made
+    # on the learned phase are late by design, so their lags are not sampled;
+    # they would push the phase later with every round.
+    def __init__(self):
+        self.upload_time = None
+        self.periods = deque(maxlen=8)
+        self.lags = deque(maxlen=8)
+        self.misses = 0
+
+    @property
+    def learned(self):
+        if not self.periods or not self.lags:
+            return False
+        period = min(self.periods)
+        agreeing = sum(sample <= period * (1 + PERIOD_TOLERANCE) for sample in self.periods)
+        return agreeing >= MIN_PERIOD_SAMPLES
+
+    # Record a fetch made at `fetched_at` (naive local time), `on_phase` if it
+    # was timed by next_upload(). Returns whether it carried a new upload.
+    def observe(self, snapshot, fetched_at, on_phase=False):
+        upload_time = snapshot.upload_time
+        if upload_time is None:
+            return False
+        if upload_time == self.upload_time:
+            self.misses += 1
+            if self.misses >= MAX_UPLOAD_MISSES:
+                self.lags.clear()
+            return False
+        if self.upload_time is not None and upload_time > self.upload_time:
+            self.periods.append(upload_time - self.upload_time)
+        self.upload_time = upload_time
+        if not on_phase:
+            self.lags.append(fetched_at - upload_time)
+        self.misses = 0
+        return True
+
+    # Expected arrival of the first upload after `not_before`, on our clock
+    def next_upload(self, not_before):
+        period = min(self.periods)
+        expected = self.upload_time + min(self.lags) + period
+        if expected < not_before:
+            expected += period * math.ceil((not_before - expected) / period)
+        return expected
+
+
+class PollScheduler:
+    # Polls every inverter registered on one API token. Each inverter is polled
+    # just after its next expected upload, never more often than the token's
+    # rate budget allows for the fleet, and rarely while it is asleep.
+    def __init__(self, hass, api_key):
+        self.hass = hass
+        self.logger = logging.getLogger(__name__)
+        self.api_key = api_key
+        self.window = CallWindow(
+            int(API_RATE_LIMIT * API_RATE_HEADROOM), API_RATE_PERIOD.total_seconds())
+        self.circuit = CircuitBreaker(
+            CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_COOLDOWN, BACKOFF_MAX)
+        # Whether inverters are fetched in batches, and whether the API was
+        # found to answer batch requests (None until the first one)
+        self.batch = False
+        self.batch_supported = None
+        self.coordinators = []
+        self._phases = {}
+        # Inverters whose next poll is timed by their upload phase
+        self._on_phase = set()
+        self._due = {}
+        self._unsub_timer = None
+
+    # Shortest interval at which every inverter on the token can be polled
+    # once without exceeding the rate budget
+    @property
+    def interval(self):
+        budget = API_RATE_LIMIT * API_RATE_HEADROOM
+        calls = len(self.coordinators)
+        if self.batching:
+            calls = math.ceil(calls / BATCH_SIZE)
+        return max(MIN_TIME_BETWEEN_UPDATES, API_RATE_PERIOD * (calls / budget))
+
+    @property
+    def batching(self):
+        return self.batch and self.batch_supported is not False
+
+    @callback
+    def async_register(self, coordinator):
+        offset = (len(self.coordinators) + 1) * GOLDEN_FRACTION % 1
+        self.coordinators.append(coordinator)
+        # Data restored from the cache is not observed: its age would be taken
+        # for an upload period
+        self._phases[coordinator] = UploadPhase()
+        # Missing or stale data is fetched straight away, under the token's
+        # budget. Until the upload phase is learned, stagger the others over
+        # the interval, not before the data restored from the cache goes stale.
+        interval = self.interval
+        if coordinator.solax_cloud.local_ready:
+            interval = LOCAL_POLL_INTERVAL
+        age = coordinator.solax_cloud.data_age
+        if age is None or age > interval:
+            delay = timedelta(0)
+        else:
+            delay = max(interval * offset, interval - age)
+        self._due[coordinator] = self.hass.loop.time() + delay.total_seconds()
+        self.logger.debug(
+            f'{len(self.coordinators)} inverter(s) on token, polling at most every {self.interval}')
+        self._async_schedule()
+
+        @callback
+        def unregister():
+            self.coordinators.remove(coordinator)
+            self._phases.pop(coordinator)
+            self._on_phase.discard(coordinator)
+            self._due.pop(coordinator)
+            self._async_schedule()
+
+        return unregister
+
+    @staticmethod
+    def _now():
+        return dt_util.now().replace(tzinfo=None)
+
+    # Arm the timer for the earliest due inverter
+    @callback
+    def _async_schedule(self):
+        if self._unsub_timer is not None:
+            self._unsub_timer()
+            self._unsub_timer = None
+        if not self._due:
+            return
+        delay = min(self._due.values()) - self.hass.loop.time()
+        if delay != math.inf:
+            self._unsub_timer = async_call_later(
+                self.hass, max(delay, 0), self._async_tick)
+
+    @callback
+    def _async_tick(self, now):
+        self._unsub_timer = None
+        loop_time = self.hass.loop.time()
+        due = [coordinator for coordinator, when in self._due.items() if when <= loop_time]
+        batches = []
+        if self.batching:
+            cloud = [coordinator for coordinator in due
+                     if not coordinator.solax_cloud.local_ready]
+            due = [coordinator for coordinator in due if coordinator.solax_cloud.local_ready]
+            # Fill the last batch up with the inverters due next: polling
+            # them early costs no extra call
+            waiting = sorted(
+                (coordinator for coordinator, when in self._due.items()
+                 if loop_time < when < math.inf and not coordinator.solax_cloud.local_ready),
+                key=self._due.get)
+            cloud += waiting[:-len(cloud) % BATCH_SIZE]
+            batches = [cloud[start:start + BATCH_SIZE]
+                       for start in range(0, len(cloud), BATCH_SIZE)]
+        # Parked until the poll completes and plans its successor. Polls run
+        # as background tasks: startup and shutdown never wait on the API.
+        for coordinator in due:
+            self._due[coordinator] = math.inf
+            self.hass.async_create_background_task(
+                self._async_poll_and_plan(coordinator), f'{DOMAIN} poll')
+        for batch in batches:
+            for coordinator in batch:
+                self._due[coordinator] = math.inf
+            self.hass.async_create_background_task(
+                self._async_poll_batch_and_plan(batch), f'{DOMAIN} batch poll')
+        self._async_schedule()
+
+    async def _async_poll_and_plan(self, coordinator):
+        try:
+            await self.async_poll(coordinator)
+        finally:
+            if coordinator in self._due:
+                delay = self._plan(coordinator)
+                self._due[coordinator] = self.hass.loop.time() + delay.total_seconds()
+                self._async_schedule()
+
+    async def _async_poll_batch_and_plan(self, coordinators):
+        try:
+            await self.async_poll_batch(coordinators)
+        finally:
+            for coordinator in coordinators:
+                if coordinator in self._due:
+                    delay = self._plan(coordinator)
+                    self._due[coordinator] = self.hass.loop.time() + delay.total_seconds()
+            self._async_schedule()
+
+    # Decide how long to wait before polling an inverter again
+    def _plan(self, coordinator):
+        now = self._now()
+        interval = self.interval
+        data = coordinator.data
+        phase = self._phases[coordinator]
+        on_phase = coordinator in self._on_phase
+        self._on_phase.discard(coordinator)
+        failures = coordinator.solax_cloud.failures
+        if failures or self.circuit.is_open:
+            # Equal jitter: half the backoff is fixed, half is random, so
+            # inverters that failed together do not retry together
+            backoff = min(BACKOFF_MAX, interval * 2 ** max(failures - 1, 0))
+            backoff = backoff / 2 + backoff * random.random() / 2
+            return max(backoff, timedelta(seconds=self.circuit.remaining()))
+        # A dongle has no upload cadence to follow and no quota to spend
+        if coordinator.solax_cloud.local_ready:
+            return LOCAL_POLL_INTERVAL
+        phase.observe(data, now, on_phase)
+        if data is EMPTY_SNAPSHOT:
+            return interval
+        if data.inverterStatus in SLEEP_STATUS_CODES:
+            return max(interval, SLEEP_POLL_INTERVAL)
+        if phase.learned and phase.misses == 0:
+            self._on_phase.add(coordinator)
+            return phase.next_upload(now + interval) + UPLOAD_GRACE - now
+        # Phase unknown, or the expected upload has not arrived yet
+        return interval
+
+    # Wait until the token's budget allows another API call
+    async def async_acquire(self):
+        while (wait := self.window.try_consume()) > 0:
+            await asyncio.sleep(wait)
+
+    # Poll an inverter's dongle, or the cloud unless the token's circuit is
+    # open. Returns whether new data was retrieved.
+    async def async_poll(self, coordinator):
+        # The dongle is outside the token's budget and circuit. If it does not
+        # answer, it is set aside and the cloud is polled straight away.
+        if coordinator.solax_cloud.local_ready:
+            if await coordinator.async_refresh():
+                return True
+        if not self.circuit.allow():
+            return False
+        await self.async_acquire()
+        success = await coordinator.async_refresh()
+        if success:
+            self.circuit.record_success()
+        else:
+            self._record_failure()
+        return success
+
+    # Poll several inverters with one request and fan the results out.
+    # Inverters missing from the answer are polled one by one, as are all of
+    # them if the API turns out not to answer batch requests. Once it has,
+    # a rejection, like the rate limit's, fails the batch instead.
+    async def async_poll_batch(self, coordinators):
+        if len(coordinators) == 1:
+            await self.async_poll(coordinators[0])
+            return
+        if not self.circuit.allow():
+            return
+        await self.async_acquire()
+        try:
+            results = await coordinators[0].solax_cloud.async_get_batch(
+                [coordinator.solax_cloud.sn for coordinator in coordinators])
+        except aiohttp.ClientResponseError as e:
+            # Not repr(e): it holds the request URL, token included
+            self._batch_failed(coordinators, f'HTTP {e.status} {e.message}')
+            return
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            self._batch_failed(coordinators, repr(e))
+            return
+
+        remaining = coordinators
+        if results is not None:
+            self.batch_supported = True
+            self.circuit.record_success()
+            remaining = []
+            for coordinator in coordinators:
+                result = results.get(coordinator.solax_cloud.sn)
+                if result is None:
+                    remaining.append(coordinator)
+                    continue
+                coordinator.async_set_result(result)
+                # Served by the request made on the first inverter's behalf
+                if coordinator is not coordinators[0]:
+                    coordinator.solax_cloud.metrics.record_cache_hit()
+        elif self.batch_supported:
+            self._batch_failed(coordinators, 'Batch request rejected')
+            return
+        elif self.batch_supported is None:
+            self.batch_supported = False
+            self.logger.warning(
+                'SolaxCloud API does not answer batch requests, polling inverters one by one')
+        for coordinator in remaining:
+            await self.async_poll(coordinator)
+
+    def _batch_failed(self, coordinators, error):
+        for coordinator in coordinators:
+            coordinator.async_set_result(None, error)
+        self._record_failure()
+
+    def _record_failure(self):
+        was_open = self.circuit.is_open
+        self.circuit.record_failure()
+        if self.circuit.is_open and not was_open:
+            self.logger.warning(
+                f'SolaxCloud API failing, pausing polls for {self.circuit.cooldown:.0f}s')
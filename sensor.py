@@ -1,815 +1,693 @@
 # Library imports
-import json
-import requests
-import logging
+import asyncio
 import voluptuous as vol
 import homeassistant.helpers.config_validation as cv
 
-from datetime import timedelta
+from collections import namedtuple
 from datetime import datetime
 
-from homeassistant.helpers.entity import Entity
-from homeassistant.util import Throttle
-from homeassistant.components.sensor import PLATFORM_SCHEMA
-
-# Frequency of data retrieval (API allows for a maximum of 10 calls per minute)
-MIN_TIME_BETWEEN_UPDATES = timedelta(minutes=5)
-
-CONF_NAME = "name"
-CONF_API_KEY = "api_key"
-CONF_SN = "sn"
-CONF_HAS_BATTERY = "battery"
+from homeassistant.const import EntityCategory
+from homeassistant.core import callback
+from homeassistant.components.sensor import (
+    PLATFORM_SCHEMA,
+    SensorDeviceClass,
+    SensorEntity,
+    SensorStateClass,
+)
+from homeassistant.util import dt as dt_util
+
+from .api import SolaxCloud
+from .capture import async_get_recorder
+from .coordinator import SolaxCloudCoordinator
+from .energy import EnergyIntegrator
+from .fleet import async_get_fleet
+from .history import InverterHistory
+from .metrics import SolaxCloudMetricsView, data_age, token_calls
+from .nowcast import PowerNowcast, async_get_nowcast_ticker
+from .scheduler import async_get_scheduler
+from .snapshot import EMPTY_SNAPSHOT, NUMERIC_FIELDS, reported_fields
+from .portal import async_import_history
+from .statistics import HourlyStatistics, METER_UNIT, async_get_fleet_statistics
+from .const import (
+    ATTR_PATH,
+    CONF_API_KEY,
+    CONF_BATCH,
+    CONF_CAPTURE,
+    CONF_BATTERY_CAPACITY,
+    CONF_DIAGNOSTICS,
+    CONF_HAS_BATTERY,
+    CONF_HISTORY,
+    CONF_LOCAL_HOST,
+    CONF_LOCAL_PASSWORD,
+    CONF_NAME,
+    CONF_NOWCAST,
+    CONF_SN,
+    CONF_STATISTICS,
+    DOMAIN,
+    NOWCAST_STEP,
+    SERVICE_IMPORT_HISTORY,
+)
 
 PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend(
     {
         vol.Required(CONF_NAME): cv.string,
         vol.Required(CONF_API_KEY): cv.string,
         vol.Required(CONF_SN): cv.string,
-        vol.Optional(CONF_HAS_BATTERY, default=False): cv.bool
+        vol.Optional(CONF_HAS_BATTERY, default=False): cv.boolean,
+        vol.Optional(CONF_BATTERY_CAPACITY, default=1): vol.All(
+            vol.Coerce(float), vol.Range(min=0, min_included=False)),
+        vol.Optional(CONF_HISTORY, default=0): cv.positive_int,
+        vol.Optional(CONF_BATCH, default=False): cv.boolean,
+        vol.Optional(CONF_CAPTURE): cv.string,
+        vol.Optional(CONF_LOCAL_HOST): cv.string,
+        vol.Optional(CONF_LOCAL_PASSWORD): cv.string,
+        vol.Optional(CONF_STATISTICS, default=False): cv.boolean,
+        vol.Optional(CONF_NOWCAST, default=False): cv.boolean,
+        vol.Optional(CONF_DIAGNOSTICS, default=False): cv.boolean
     }
 )
 
-# Set up the SolaxCloud platform
-def setup_platform(hass, config, add_entities, discovery_info=None):
-    solax_cloud = SolaxCloud(
-        hass, config[CONF_NAME], config[CONF_API_KEY], config[CONF_SN], config[CONF_HAS_BATTERY])
-    # Add the sensors to the platform
-    add_entities([YieldTodaySensor(hass, solax_cloud),
-                  YieldTotalSensor(hass, solax_cloud),
-                  FeedinPowerSensor(hass, solax_cloud),
-                  FeedinEnergySensor(hass, solax_cloud),
-                  ConsumeEnergySensor(hass, solax_cloud),
-                  FeedinPowerM2Sensor(hass, solax_cloud),
-                  InverterTypeSensor(hass, solax_cloud),
-                  InverterStatusSensor(hass, solax_cloud),
-                  UpdateTimeSensor(hass, solax_cloud),
-                  PowerDC1Sensor(hass, solax_cloud),
-                  PowerDC2Sensor(hass, solax_cloud),
-                  PowerDC3Sensor(hass, solax_cloud),
-                  PowerDC4Sensor(hass, solax_cloud),
-                  ], True)
-
-    # Only add the battery sensors if user indicates that have storage available
-    if (config[CONF_HAS_BATTERY]):
-        add_entities([ACPowerSensor(hass, solax_cloud),
-                      SocSensor(hass, solax_cloud),
-                      Peps1Sensor(hass, solax_cloud),
-                      Peps2Sensor(hass, solax_cloud),
-                      Peps3Sensor(hass, solax_cloud),
-                      BatPowerSensor(hass, solax_cloud),
-                      ], True)
-
-# Dictionary table that converts Inverter Type Code into Inverter Type (Table 4)
-def inverter_type(code):
-    switch = {
-        '1'  : 'X1-LX',
-        '2'  : 'X-Hybrid',
-        '3'  : 'X1-Hybrid/Fit',
-        '4'  : 'X1-Boost/Air/Mini',
-        '5'  : 'X3-Hybrid/Fit',
-        '6'  : 'X3-20K/30K',
-        '7'  : 'X3-MIC/PRO',
-        '8'  : 'X1-Smart',
-        '9'  : 'X1-AC',
-        '10' : 'A1-Hybrid',
-        '11' : 'A1-Fit',
-        '12' : 'A1-Grid',
-        '13' : 'J1-ESS',
-        '14' : 'X3-Hybrid-G4',
-        '15' : 'X1-Hybrid-G4',
-        '16' : 'X3-MIC/PRO-G2',
-        '17' : 'X1-SPT',
-        '18' : 'X1-Boost/Mini-G4',
-        '19' : 'A1-HYB-G2',
-        '20' : 'A1-AC-G2',
-        '21' : 'A1-SMT-G2',
-        '22' : 'X3-FTH',
-        '23' : 'X3-MGA-G2',
-    }
-    return 'Unknown' if code not in switch else switch.get(code, 1)
-
-# Dictionary table that converts Status Code into Inverter Status (Table 5)
-def inverter_status(code):
-    switch = {
-        '100' : 'Wait Mode',
-        '101' : 'Check Mode',
-        '102' : 'Normal Mode',
-        '103' : 'Fault Mode',
-        '104' : 'Permanent Fault Mode',
-        '105' : 'Update Mode',
-        '106' : 'EPS Check Mode',
-        '107' : 'EPS Mode',
-        '108' : 'Self-Test Mode',
-        '109' : 'Idle Mode',
-        '110' : 'Standby Mode',
-        '111' : 'Pv Wake Up Bat Mode',
-        '112' : 'Gen Check Mode',
-        '113' : 'Gen Run Mode'
+IMPORT_HISTORY_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_PATH): cv.string,
+        vol.Optional(CONF_SN): cv.string,
     }
-    return 'Unknown' if code not in switch else switch.get(code, 1)
-
-class SolaxCloud:
-    def __init__(self, hass, name, api_key, sn, battery):
-        self.hass = hass
-        self.logger = logging.getLogger(__name__)
-        self.api_key = api_key
-        self.sn = sn
-        self.battery = battery
-        self.inverter_name = name
-        self.data = {}
-        self.uri = f'ttps://www.solaxcloud.com/proxyApp/proxy/api/getRealtimeInfo.do?tokenId={api_key}&sn={sn}'
-        self.last_data_time = None
-
-    # Retrieve data from API access point
-    def get_data(self):
-        # If there is no data, or the data needs to be updated
-        if not self.data or datetime.now() - self.last_data_time > MIN_TIME_BETWEEN_UPDATES:
-            try:
-                data = requests.get(self.uri).json()
-                if data['success'] == True:
-                    self.data = data['result']
-                    self.last_data_time = datetime.now()
-                    self.logger.info(
-                        f'Retrieved new data from SolaxCloud {self.inverter_name}')
-                else:
-                    self.data = {}
-                    self.logger.error(data['exception'])
-            except requests.exceptions.ConnectionError as e:
-                self.logger.error(str(e))
-                self.data = {}
-
-# Each sensor class is named using the convention: {API items}Sensor
-# This comes from Table 3 of the API documentation
-
-# Inverter.AC.power.total
-class ACPowerSensor(Entity):
-    # The current amount of solar generation (in watts)
-    def __init__(self, hass, solax_cloud):
-        self._name = solax_cloud.inverter_name + ' Current Yield'
-        self.hass = hass
-        self.solax_cloud = solax_cloud
-
-    @property
-    def name(self):
-        return self._name
-
-    @property
-    def state(self):
-        data = self.solax_cloud.data.get('acpower')
-        return float('nan') if data is None else data
-
-    @property
-    def unit_of_measurement(self):
-        return 'W'
-
-    @property
-    def icon(self):
-        return 'mdi:solar-power'
-
-    @property
-    def friendly_name(self):
-        return 'Current Solar Generation'
-
-    @Throttle(MIN_TIME_BETWEEN_UPDATES)
-    def update(self):
-        self.solax_cloud.get_data()
-
-# Inverter.AC.energy.out.daily
-class YieldTodaySensor(Entity):
-    # The amount of solar generation today (in kilowatt-hours)
-    def __init__(self, hass, solax_cloud):
-        self._name = solax_cloud.inverter_name + ' Daily Yield'
-        self.hass = hass
-        self.solax_cloud = solax_cloud
-
-    @property
-    def name(self):
-        return self._name
-
-    @property
-    def state(self):
-        data = self.solax_cloud.data.get('yieldtoday')
-        return float('nan') if data is None else data
-
-    @property
-    def unit_of_measurement(self):
-        return 'kWh'
-
-    @property
-    def icon(self):
-        return 'mdi:solar-power'
-
-    @property
-    def friendly_name(self):
-        return 'Daily Solar Yield'
-
-    @Throttle(MIN_TIME_BETWEEN_UPDATES)
-    def update(self):
-        self.solax_cloud.get_data()
-
-# Inverter.AC.energy.out.total
-class YieldTotalSensor(Entity):
-    # The total lifetime solar generation (in kilowatts-hours)
-    def __init__(self, hass, solax_cloud):
-        self._name = solax_cloud.inverter_name + ' Total Yield'
-        self.hass = hass
-        self.solax_cloud = solax_cloud
-
-    @property
-    def name(self):
-        return self._name
-
-    @property
-    def state(self):
-        data = self.solax_cloud.data.get('yieldtotal')
-        return float('nan') if data is None else data
-
-    @property
-    def unit_of_measurement(self):
-        return 'kWh'
-
-    @property
-    def icon(self):
-        return 'mdi:solar-power'
-
-    @property
-    def friendly_name(self):
-        return 'Lifetime Solar Yield'
+)
 
-    @Throttle(MIN_TIME_BETWEEN_UPDATES)
-    def update(self):
-        self.solax_cloud.get_data()
+# Set up the SolaxCloud platform
+async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
+    local_host = config.get(CONF_LOCAL_HOST)
+    solax_cloud = SolaxCloud(
+        hass, config[CONF_NAME], config[CONF_API_KEY], config[CONF_SN], config[CONF_HAS_BATTERY],
+        local_url=local_host and f'http://{local_host}/',
+        local_password=config.get(CONF_LOCAL_PASSWORD))
+    if CONF_CAPTURE in config:
+        solax_cloud.recorder = async_get_recorder(hass, config[CONF_CAPTURE])
+    coordinator = SolaxCloudCoordinator(hass, solax_cloud)
+    scheduler = async_get_scheduler(hass, config[CONF_API_KEY])
+    scheduler.batch = scheduler.batch or config[CONF_BATCH]
+    energy = coordinator.energy = EnergyIntegrator(hass, config[CONF_SN])
+    # Come up from the cached payload. Setup never waits for the API: the
+    # scheduler fetches missing or stale data in the background once the
+    # inverter is registered, concurrently with the rest of the fleet.
+    await asyncio.gather(solax_cloud.async_restore(), energy.async_restore())
+    age = solax_cloud.data_age
+    if age is not None and age <= scheduler.interval:
+        solax_cloud.metrics.record_cache_hit()
+
+    # Integrate energy from each new upload, ahead of the entities showing it
+    energy.update(coordinator.data)
+    coordinator.async_add_listener(lambda: energy.update(coordinator.data))
+
+    # Keep rolling statistics over the last uploads if asked to
+    if config[CONF_HISTORY]:
+        history = coordinator.history = InverterHistory(config[CONF_HISTORY])
+        history.append(coordinator.data)
+        coordinator.async_add_listener(lambda: history.append(coordinator.data))
+
+    # Learn from each new upload to estimate the power until the next one
+    if config[CONF_NOWCAST]:
+        nowcast = coordinator.nowcast = PowerNowcast(hass.config.latitude, hass.config.longitude)
+        nowcast.update(coordinator.data)
+        coordinator.async_add_listener(lambda: nowcast.update(coordinator.data))
+
+    # Keep hourly statistics of the inverter and the fleet for the recorder.
+    # They are in place before any sensor is added, as they decide the
+    # sensors' state class.
+    fleet = async_get_fleet(hass)
+    statistics_restored = None
+    if config[CONF_STATISTICS]:
+        if 'recorder' in hass.config.components:
+            statistics_restored = async_create_statistics(hass, coordinator, fleet, config)
+        else:
+            solax_cloud.logger.warning(
+                f'SolaxCloud {config[CONF_NAME]} statistics need the recorder, which is not set up')
+
+    # Add the sensors of the items the inverter reports, and the others once
+    # they first appear in a payload. The battery sensors are added up front
+    # if user indicates that have storage available.
+    added = set()
+    nowcast_types = NOWCAST_TYPES if config[CONF_NOWCAST] else ()
+    total = len(SENSOR_TYPES) + len(ENERGY_TYPES) + len(nowcast_types)
+
+    @callback
+    def async_discover():
+        if len(added) == total:
+            return
+        reported = reported_fields(coordinator.data)
+
+        def wanted(description, field):
+            if description.key in added:
+                return False
+            return (field not in NUMERIC_FIELDS or field in reported
+                    or config[CONF_HAS_BATTERY] and description.battery)
+
+        entities = [SolaxCloudSensor(hass, coordinator, description)
+                    for description in SENSOR_TYPES if wanted(description, description.key)]
+        entities += [SolaxCloudEnergySensor(hass, coordinator, description)
+                     for description in ENERGY_TYPES if wanted(description, description.field)]
+        entities += [SolaxCloudNowcastSensor(hass, coordinator, description)
+                     for description in nowcast_types if wanted(description, description.field)]
+        if entities:
+            added.update(entity.description.key for entity in entities)
+            async_add_entities(entities)
+
+    async_discover()
+    coordinator.async_add_listener(async_discover)
+
+    # Aggregate the whole fleet once there is more than one inverter
+    fleet.async_add_inverter(coordinator, config[CONF_BATTERY_CAPACITY])
+    if fleet.inverters > 1 and not fleet.entities_added:
+        fleet.entities_added = True
+        async_add_entities([SolaxCloudFleetSensor(hass, fleet, description)
+                            for description in FLEET_TYPES])
+
+    # Feed the statistics each new upload once the fleet has taken it into
+    # account
+    if statistics_restored is not None:
+        await statistics_restored
+        async_setup_statistics(hass, coordinator, fleet, config)
+
+    # Poll from now on, starting with the initial fetch if one is needed
+    scheduler.async_register(coordinator)
+
+    # Report on the polling itself if asked to
+    if config[CONF_DIAGNOSTICS]:
+        async_add_entities([SolaxCloudDiagnosticSensor(hass, coordinator, scheduler, description)
+                            for description in DIAGNOSTIC_TYPES])
+        domain_data = hass.data.setdefault(DOMAIN, {})
+        if not domain_data.get('metrics_view'):
+            hass.http.register_view(SolaxCloudMetricsView)
+            domain_data['metrics_view'] = True
+
+# Create the hourly statistics of the inverter and get the fleet's. Returns
+# what restores them; until then they take no uploads.
+@callback
+def async_create_statistics(hass, coordinator, fleet, config):
+    statistics = coordinator.statistics = HourlyStatistics(
+        hass, config[CONF_SN], config[CONF_NAME], STATISTICS_FIELDS)
+    fleet.statistics, fleet_restored = async_get_fleet_statistics(
+        hass, FLEET_NAME, FLEET_STATISTICS_FIELDS)
+    return asyncio.gather(fleet_restored, statistics.async_restore())
+
+# Aggregate each new upload into the inverter's hourly statistics and the
+# fleet's. The fleet's readings are its aggregates; its meters grow with the
+# inverters'.
+@callback
+def async_setup_statistics(hass, coordinator, fleet, config):
+    statistics = coordinator.statistics
+    fleet_statistics = fleet.statistics
+    sn = config[CONF_SN]
+    hass.data[DOMAIN].setdefault('statistics', {})[sn] = statistics
+
+    @callback
+    def async_add_upload():
+        snapshot = coordinator.data
+        values = snapshot._asdict()
+        values.update(coordinator.energy.totals)
+        if not statistics.add(sn, snapshot.upload_time, values):
+            return
+        values.update(feedinpower=fleet.totals['feedinpower'],
+                      batpower=fleet.totals['batpower'], soc=fleet.soc)
+        fleet_statistics.add(sn, snapshot.upload_time, values)
+
+    coordinator.async_add_listener(async_add_upload)
+
+    # Backfill the statistics from the portal's history exports
+    if not hass.services.has_service(DOMAIN, SERVICE_IMPORT_HISTORY):
+        async def async_handle_import(call):
+            await async_import_history(hass, call.data[ATTR_PATH], call.data.get(CONF_SN))
+
+        hass.services.async_register(
+            DOMAIN, SERVICE_IMPORT_HISTORY, async_handle_import, IMPORT_HISTORY_SCHEMA)
+
+# Describes one sensor: the snapshot field it reads, how it is presented and
+# whether it only applies to inverters with battery storage. Sensors of API
+# items are added once the inverter reports them, the others right away.
+SensorDescription = namedtuple(
+    'SensorDescription',
+    ('key', 'name', 'unit', 'icon', 'battery'),
+    defaults=(None, 'mdi:solar-power', False))
+
+# Each sensor is named after its API item, from Table 3 of the API
+# documentation
+SENSOR_TYPES = (
+    # Inverter.AC.energy.out.daily: solar generation today
+    SensorDescription('yieldtoday', 'Daily Yield', 'kWh'),
+    # Inverter.AC.energy.out.total: lifetime solar generation
+    SensorDescription('yieldtotal', 'Total Yield', 'kWh'),
+    # Grid.power.total: negative value means drawing power from grid
+    SensorDescription('feedinpower', 'Grid Power Total', 'W', 'mdi:transmission-tower'),
+    # Grid.energy.toGrid.total: energy sent out to the main grid
+    SensorDescription('feedinenergy', 'To Grid Yield', 'kWh', 'mdi:transmission-tower'),
+    # Grid.energy.fromGrid.total: energy drawn from the main grid
+    SensorDescription('consumeenergy', 'From Grid Yield', 'kWh', 'mdi:transmission-tower'),
+    # Inverter.Meter2.AC.power.total
+    SensorDescription('feedinpowerM2', 'AC power', 'W'),
+    # Inverter type (Table 4)
+    SensorDescription('inverter_type', 'Inverter type'),
+    # Inverter status (Table 5)
+    SensorDescription('inverter_status', 'Inverter status'),
+    # Timestamp of the last data upload
+    SensorDescription('upload_time', 'Update time', icon='mdi:clock-outline'),
+    # Inverter.DC.PV.power.MPPT1-4
+    SensorDescription('powerdc1', 'MPPT 1', 'W'),
+    SensorDescription('powerdc2', 'MPPT 2', 'W'),
+    SensorDescription('powerdc3', 'MPPT 3', 'W'),
+    SensorDescription('powerdc4', 'MPPT 4', 'W'),
+    # Inverter.AC.power.total: current solar generation
+    SensorDescription('acpower', 'Current Yield', 'W', battery=True),
+    # BMS.energy.SOC: battery charge level
+    SensorDescription('soc', 'State of charge', '%', 'mdi:battery', battery=True),
+    # Inverter.AC.EPS.power.R/S/T: emergency power supply
+    SensorDescription('peps1', 'ESP R', 'W', battery=True),
+    SensorDescription('peps2', 'ESP S', 'W', battery=True),
+    SensorDescription('peps3', 'ESP T', 'W', battery=True),
+    # Inverter.DC.Battery.power.total
+    SensorDescription('batpower', 'Battery power', 'W', 'mdi:battery', battery=True),
+)
 
-# Grid.power.total
-class FeedinPowerSensor(Entity):
-    # Current energy usage from Grid (in watts) 
-    # Negative value means drawing pwoer from grid
-    def __init__(self, hass, solax_cloud):
-        self._name = solax_cloud.inverter_name + ' Grid Power Total'
+# Device and state class by unit, so the recorder compiles statistics of
+# readings and meters. Energy meters only ever grow, apart from the daily
+# yield's reset at midnight.
+UNIT_CLASSES = {
+    'W': (SensorDeviceClass.POWER, SensorStateClass.MEASUREMENT),
+    'kWh': (SensorDeviceClass.ENERGY, SensorStateClass.TOTAL_INCREASING),
+    '%': (SensorDeviceClass.BATTERY, SensorStateClass.MEASUREMENT),
+    'ms': (SensorDeviceClass.DURATION, SensorStateClass.MEASUREMENT),
+    's': (SensorDeviceClass.DURATION, SensorStateClass.MEASUREMENT),
+}
+NO_CLASSES = (None, None)
+
+# Units of the readings that get rolling statistics; totals do not
+ROLLING_UNITS = ('W', '%')
+
+# A single entity class serves every API item. Entities never poll
+# themselves, they are pushed new data by the inverter's coordinator.
+class SolaxCloudSensor(SensorEntity):
+    # Rolling statistics change with every update; recording them would add
+    # an attributes row per state
+    _unrecorded_attributes = frozenset({'mean', 'min', 'max', 'rate_per_hour'})
+
+    def __init__(self, hass, coordinator, description):
         self.hass = hass
-        self.solax_cloud = solax_cloud
+        self.coordinator = coordinator
+        self.solax_cloud = coordinator.solax_cloud
+        self.description = description
+        self._name = f'{coordinator.solax_cloud.inverter_name} {description.name}'
 
     @property
     def name(self):
         return self._name
 
+    # Unavailable until the first payload arrives, if none was cached, and
+    # whenever the payload lacks the item
     @property
-    def state(self):
-        data = self.solax_cloud.data.get('feedinpower')
-        return float('nan') if data is None else data
+    def available(self):
+        snapshot = self.solax_cloud.snapshot
+        return (snapshot is not EMPTY_SNAPSHOT
+                and getattr(snapshot, self.description.key) is not None)
 
     @property
-    def unit_of_measurement(self):
-        return 'W'
-
-    @property
-    def icon(self):
-        return 'mdi:transmission-tower'
-
-    @property
-    def friendly_name(self):
-        return 'Current Energy Usage'
-
-    @Throttle(MIN_TIME_BETWEEN_UPDATES)
-    def update(self):
-        self.solax_cloud.get_data()
-
-# Grid.energy.toGrid.total
-class FeedinEnergySensor(Entity):
-    # ?? Amount of energy sent out to the main grid (in kilowatt-hours) ??
-    def __init__(self, hass, solax_cloud):
-        self._name = solax_cloud.inverter_name + ' To Grid Yield'
-        self.hass = hass
-        self.solax_cloud = solax_cloud
+    def native_value(self):
+        data = getattr(self.solax_cloud.snapshot, self.description.key)
+        # The upload time is on the inverter's clock, set to local time
+        if isinstance(data, datetime):
+            return data.replace(tzinfo=dt_util.DEFAULT_TIME_ZONE)
+        return data
 
     @property
-    def name(self):
-        return self._name
+    def native_unit_of_measurement(self):
+        return self.description.unit
 
     @property
-    def state(self):
-        data = self.solax_cloud.data.get('feedinenergy')
-        return float('nan') if data is None else data
+    def device_class(self):
+        if self.description.key == 'upload_time':
+            return SensorDeviceClass.TIMESTAMP
+        return UNIT_CLASSES.get(self.description.unit, NO_CLASSES)[0]
 
+    # With the integration's own statistics the recorder has none to compile
     @property
-    def unit_of_measurement(self):
-        return 'kWh'
+    def state_class(self):
+        if self.coordinator.statistics is not None:
+            return None
+        return UNIT_CLASSES.get(self.description.unit, NO_CLASSES)[1]
 
     @property
     def icon(self):
-        return 'mdi:transmission-tower'
-
-    @property
-    def friendly_name(self):
-        return 'Energy To Grid'
-
-    @Throttle(MIN_TIME_BETWEEN_UPDATES)
-    def update(self):
-        self.solax_cloud.get_data()
+        return self.description.icon
+
+    # Rolling statistics of instantaneous readings if history is enabled.
+    # While fetches fail the last good data is served, flagged with when it
+    # was fetched and the error that interrupted the fetches. Both hold for
+    # the whole outage, so the entity need not be rewritten as it goes on.
+    @property
+    def extra_state_attributes(self):
+        attributes = {}
+        history = self.coordinator.history
+        if history is not None and self.description.unit in ROLLING_UNITS:
+            attributes.update(history.stats(self.description.key) or {})
+        fetched_at = self.solax_cloud.last_data_time
+        if self.solax_cloud.failures and fetched_at is not None:
+            attributes['last_success'] = fetched_at.astimezone()
+            attributes['error'] = self.solax_cloud.last_error
+        return attributes or None
+
+    @property
+    def should_poll(self):
+        return False
+
+    async def async_added_to_hass(self):
+        self.async_on_remove(
+            self.coordinator.async_add_listener(
+                self.async_write_ha_state, self.description.key))
+        # The rolling statistics move with every upload, even when the value
+        # stays the same, like the AC power all night
+        if self.coordinator.history is not None and self.description.unit in ROLLING_UNITS:
+            self.async_on_remove(
+                self.coordinator.async_add_listener(self.async_write_ha_state, 'uploadTime'))
+
+
+# Describes one energy counter integrated from power readings, added once
+# the inverter reports the API item `field`
+EnergyDescription = namedtuple(
+    'EnergyDescription', ('key', 'name', 'icon', 'field', 'battery'))
+
+ENERGY_TYPES = (
+    # Integrated from Inverter.DC.Battery.power.total, by direction
+    EnergyDescription('battery_charge', 'Battery charged', 'mdi:battery-arrow-up',
+                      'batpower', True),
+    EnergyDescription('battery_discharge', 'Battery discharged', 'mdi:battery-arrow-down',
+                      'batpower', True),
+    # Integrated from Inverter.DC.PV.power.MPPT1-4
+    EnergyDescription('pv_energy', 'PV energy', 'mdi:solar-power', 'powerdc1', False),
+    # Integrated from the AC output less what is fed into the grid
+    EnergyDescription('self_consumption', 'Self-consumption', 'mdi:home-lightning-bolt',
+                      'feedinpower', False),
+)
 
-# Grid.energy.fromGrid.total
-class ConsumeEnergySensor(Entity):
-    # ?? Amount of energy drawn from the main grid (in kilowatt-hours) ??
-    def __init__(self, hass, solax_cloud):
-        self._name = solax_cloud.inverter_name + ' From Grid Yield'
+# Energy counter in kWh, written whenever a new upload was integrated
+class SolaxCloudEnergySensor(SensorEntity):
+    def __init__(self, hass, coordinator, description):
         self.hass = hass
-        self.solax_cloud = solax_cloud
+        self.coordinator = coordinator
+        self.description = description
+        self._name = f'{coordinator.solax_cloud.inverter_name} {description.name}'
 
     @property
     def name(self):
         return self._name
 
     @property
-    def state(self):
-        data = self.solax_cloud.data.get('consumeenergy')
-        return float('nan') if data is None else data
+    def native_value(self):
+        return round(self.coordinator.energy.totals[self.description.key], 3)
 
     @property
-    def unit_of_measurement(self):
+    def native_unit_of_measurement(self):
         return 'kWh'
 
     @property
-    def icon(self):
-        return 'mdi:transmission-tower'
-
-    @property
-    def friendly_name(self):
-        return 'Energy From Grid'
-
-    @Throttle(MIN_TIME_BETWEEN_UPDATES)
-    def update(self):
-        self.solax_cloud.get_data()
-
-# Inverter.Meter2.AC.power.total
-class FeedinPowerM2Sensor(Entity):
-    # ?? -- (in watts) ??
-    def __init__(self, hass, solax_cloud):
-        self._name = solax_cloud.inverter_name + ' AC power'
-        self.hass = hass
-        self.solax_cloud = solax_cloud
-
-    @property
-    def name(self):
-        return self._name
-
-    @property
-    def state(self):
-        data = self.solax_cloud.data.get('feedinpowerM2')
-        return float('nan') if data is None else data
-
-    @property
-    def unit_of_measurement(self):
-        return 'W'
-
-    @property
-    def icon(self):
-        return 'mdi:solar-power'
-
-    @property
-    def friendly_name(self):
-        return 'TBA'
-
-    @Throttle(MIN_TIME_BETWEEN_UPDATES)
-    def update(self):
-        self.solax_cloud.get_data()
-
-# BMS.energy.SOC
-class SocSensor(Entity):
-    # ?? Current battery level (as a percentage) ??
-    def __init__(self, hass, solax_cloud):
-        self._name = solax_cloud.inverter_name + ' State of charge'
-        self.hass = hass
-        self.solax_cloud = solax_cloud
-
-    @property
-    def name(self):
-        return self._name
-
-    @property
-    def state(self):
-        data = self.solax_cloud.data.get('soc')
-        return float('nan') if data is None else data
+    def device_class(self):
+        return SensorDeviceClass.ENERGY
 
     @property
-    def unit_of_measurement(self):
-        return '%'
+    def state_class(self):
+        if self.coordinator.statistics is not None:
+            return None
+        return SensorStateClass.TOTAL_INCREASING
 
     @property
     def icon(self):
-        return 'mdi:battery'
-
-    @property
-    def friendly_name(self):
-        return 'Battery Charge Level'
-
-    @Throttle(MIN_TIME_BETWEEN_UPDATES)
-    def update(self):
-        self.solax_cloud.get_data()
-
-# Inverter.AC.EPS.power.R
-class Peps1Sensor(Entity):
-    # ?? -- (in watts) ??
-    # ?? emergency power supply ??
-    def __init__(self, hass, solax_cloud):
-        self._name = solax_cloud.inverter_name + ' ESP R'
-        self.hass = hass
-        self.solax_cloud = solax_cloud
+        return self.description.icon
 
     @property
-    def name(self):
-        return self._name
+    def should_poll(self):
+        return False
 
-    @property
-    def state(self):
-        data = self.solax_cloud.data.get('peps1')
-        return float('nan') if data is None else data
+    async def async_added_to_hass(self):
+        self.async_on_remove(
+            self.coordinator.async_add_listener(self.async_write_ha_state, 'uploadTime'))
 
-    @property
-    def unit_of_measurement(self):
-        return 'W'
 
-    @property
-    def icon(self):
-        return 'mdi:solar-power'
+# Describes one power nowcast, added once the inverter reports the API item
+# `field` it estimates
+NowcastDescription = namedtuple(
+    'NowcastDescription', ('key', 'name', 'icon', 'field', 'battery'))
 
-    @property
-    def friendly_name(self):
-        return 'TBA'
+NOWCAST_TYPES = (
+    NowcastDescription('acpower_nowcast', 'Current Yield nowcast', 'mdi:solar-power',
+                       'acpower', True),
+    NowcastDescription('feedinpower_nowcast', 'Grid Power Total nowcast',
+                       'mdi:transmission-tower', 'feedinpower', False),
+    NowcastDescription('batpower_nowcast', 'Battery power nowcast', 'mdi:battery',
+                       'batpower', True),
+)
 
-    @Throttle(MIN_TIME_BETWEEN_UPDATES)
-    def update(self):
-        self.solax_cloud.get_data()
+# Estimate of a power between uploads, written every few seconds and on each
+# new upload. It is a guess to act on, not a reading: it keeps no statistics.
+class SolaxCloudNowcastSensor(SensorEntity):
+    _unrecorded_attributes = frozenset({'confidence', 'observed_at'})
 
-# Inverter.AC.EPS.power.S
-class Peps2Sensor(Entity):
-    # ?? -- (in watts) ??
-    # ?? emergency power supply ??
-    def __init__(self, hass, solax_cloud):
-        self._name = solax_cloud.inverter_name + ' ESP S'
+    def __init__(self, hass, coordinator, description):
         self.hass = hass
-        self.solax_cloud = solax_cloud
+        self.coordinator = coordinator
+        self.description = description
+        self._name = f'{coordinator.solax_cloud.inverter_name} {description.name}'
+        self._value = None
+        self._confidence = None
 
     @property
     def name(self):
         return self._name
 
     @property
-    def state(self):
-        data = self.solax_cloud.data.get('peps2')
-        return float('nan') if data is None else data
-
-    @property
-    def unit_of_measurement(self):
-        return 'W'
-
-    @property
-    def icon(self):
-        return 'mdi:solar-power'
-
-    @property
-    def friendly_name(self):
-        return 'TBA'
-
-    @Throttle(MIN_TIME_BETWEEN_UPDATES)
-    def update(self):
-        self.solax_cloud.get_data()
-
-# Inverter.AC.EPS.power.T
-class Peps3Sensor(Entity):
-    # ?? -- (in watts) ??
-    # ?? emergency power supply ??
-    def __init__(self, hass, solax_cloud):
-        self._name = solax_cloud.inverter_name + ' ESP T'
-        self.hass = hass
-        self.solax_cloud = solax_cloud
-
-    @property
-    def name(self):
-        return self._name
+    def available(self):
+        return (self.coordinator.nowcast.ready
+                and getattr(self.coordinator.data, self.description.field) is not None)
 
     @property
-    def state(self):
-        data = self.solax_cloud.data.get('peps3')
-        return float('nan') if data is None else data
+    def native_value(self):
+        return self._value
 
     @property
-    def unit_of_measurement(self):
+    def native_unit_of_measurement(self):
         return 'W'
 
     @property
-    def icon(self):
-        return 'mdi:solar-power'
-
-    @property
-    def friendly_name(self):
-        return 'TBA'
-
-    @Throttle(MIN_TIME_BETWEEN_UPDATES)
-    def update(self):
-        self.solax_cloud.get_data()
-
-# Inverter type (Table 4)
-class InverterTypeSensor(Entity):
-    # The type/model of inverter
-    def __init__(self, hass, solax_cloud):
-        self._name = solax_cloud.inverter_name + ' Inverter type'
-        self.hass = hass
-        self.solax_cloud = solax_cloud
-
-    @property
-    def name(self):
-        return self._name
-
-    @property
-    def state(self):
-        data_raw = self.solax_cloud.data.get('inverterType')
-
-        # Convert data into meaningful information (code to model)
-        #data = ''
-        #if(data_raw == '1'):
-        #     data = 'X1-LX'
-        # elif(data_raw == '2'):
-        #     data = 'X-Hybrid'
-        # elif(data_raw == '3'):
-        #     data = 'X1-Hybrid/Fit'
-        # elif(data_raw == '4'):
-        #     data = 'X1-Boost/Air/Mini'
-        # elif(data_raw == '5'):
-        #     data = 'X3-Hybrid/Fit'
-        # elif(data_raw == '6'):
-        #     data = 'X3-20K/30K'
-        # elif(data_raw == '7'):
-        #     data = 'X3-MIC/PRO'
-        # elif(data_raw == '8'):
-        #     data = 'X1-Smart'
-        # elif(data_raw == '9'):
-        #     data = 'X1-AC'
-        # elif(data_raw == '10'):
-        #     data = 'A1-Hybrid'
-        # elif(data_raw == '11'):
-        #     data = 'A1-Fit'
-        # elif(data_raw == '12'):
-        #     data = 'A1-Grid'
-        # elif(data_raw == '13'):
-        #     data = 'J1-ESS'
-        # else:
-        #     data = 'Unknown'
-
-        data = inverterType(data_raw)
-
-        return data
+    def device_class(self):
+        return SensorDeviceClass.POWER
 
     @property
     def icon(self):
-        return 'mdi:solar-power'
-
-    @property
-    def friendly_name(self):
-        return 'Inverter Type'
-
-    @Throttle(MIN_TIME_BETWEEN_UPDATES)
-    def update(self):
-        self.solax_cloud.get_data()
+        return self.description.icon
+
+    # Confidence in percent and the time of the upload the estimate is from
+    @property
+    def extra_state_attributes(self):
+        nowcast = self.coordinator.nowcast
+        observed_at = nowcast.observed_at and nowcast.observed_at.astimezone()
+        return {'confidence': self._confidence, 'observed_at': observed_at}
+
+    @property
+    def should_poll(self):
+        return False
+
+    # Estimate the power now. Returns whether the estimate changed.
+    def _estimate(self):
+        nowcast = self.coordinator.nowcast
+        if not nowcast.ready:
+            return False
+        now = dt_util.utcnow()
+        value = round(nowcast.estimate(now)[self.description.field] / NOWCAST_STEP) * NOWCAST_STEP
+        confidence = round(nowcast.confidence(now) * 100)
+        if (value, confidence) == (self._value, self._confidence):
+            return False
+        self._value = value
+        self._confidence = confidence
+        return True
+
+    # Between uploads the estimate is only written when it changed. Each
+    # upload is, as it can also change whether the sensor is available.
+    @callback
+    def _async_tick(self):
+        if self._estimate():
+            self.async_write_ha_state()
+
+    @callback
+    def _async_upload(self):
+        self._estimate()
+        self.async_write_ha_state()
+
+    async def async_added_to_hass(self):
+        self._estimate()
+        self.async_on_remove(
+            async_get_nowcast_ticker(self.hass).async_add_listener(self._async_tick))
+        self.async_on_remove(
+            self.coordinator.async_add_listener(self._async_upload, 'uploadTime'))
+
+
+# Describes one diagnostic sensor: `value` reads it from the inverter's
+# SolaxCloud instance and the scheduler of its token. Counters only grow.
+DiagnosticDescription = namedtuple(
+    'DiagnosticDescription', ('key', 'name', 'unit', 'icon', 'value', 'counter'),
+    defaults=(False,))
+
+DIAGNOSTIC_TYPES = (
+    DiagnosticDescription(
+        'api_latency', 'API latency', 'ms', 'mdi:timer-outline',
+        lambda solax_cloud, scheduler: None if solax_cloud.metrics.last_latency is None
+        else round(solax_cloud.metrics.last_latency * 1000)),
+    DiagnosticDescription(
+        'api_requests', 'API requests', None, 'mdi:cloud-download-outline',
+        lambda solax_cloud, scheduler: solax_cloud.metrics.requests, True),
+    DiagnosticDescription(
+        'api_errors', 'API errors', None, 'mdi:cloud-alert',
+        lambda solax_cloud, scheduler: sum(solax_cloud.metrics.errors.values()), True),
+    DiagnosticDescription(
+        'api_cache_hits', 'API cache hits', None, 'mdi:cached',
+        lambda solax_cloud, scheduler: solax_cloud.metrics.cache_hits, True),
+    DiagnosticDescription(
+        'data_age', 'Data age', 's', 'mdi:clock-alert-outline',
+        lambda solax_cloud, scheduler: None if data_age(solax_cloud) is None
+        else round(data_age(solax_cloud))),
+    DiagnosticDescription(
+        'api_token_calls', 'API calls per minute', None, 'mdi:speedometer',
+        lambda solax_cloud, scheduler: token_calls(scheduler)),
+)
 
-# Inverter status (Table 5)
-class InverterStatusSensor(Entity):
-    # The current status of the inverter
-    def __init__(self, hass, solax_cloud):
-        self._name = solax_cloud.inverter_name + ' Inverter status'
+# Polling cost of an inverter, written after every fetch attempt
+class SolaxCloudDiagnosticSensor(SensorEntity):
+    def __init__(self, hass, coordinator, scheduler, description):
         self.hass = hass
-        self.solax_cloud = solax_cloud
+        self.coordinator = coordinator
+        self.scheduler = scheduler
+        self.solax_cloud = coordinator.solax_cloud
+        self.description = description
+        self._name = f'{coordinator.solax_cloud.inverter_name} {description.name}'
 
     @property
     def name(self):
         return self._name
 
     @property
-    def state(self):
-        data_raw = self.solax_cloud.data.get('inverterStatus')
-
-        # Convert data into meaningful information (code to status)
-        # data = ''
-        # if(data_raw == '100'):
-        #     data = 'Wait Mode'
-        # elif(data_raw == '101'):
-        #     data = 'Check Mode'
-        # elif(data_raw == '102'):
-        #     data = 'Normal Mode'
-        # elif(data_raw == '103'):
-        #     data = 'Fault Mode'
-        # elif(data_raw == '104'):
-        #     data = 'Permanent Fault Mode'
-        # elif(data_raw == '105'):
-        #     data = 'Update Mode'
-        # elif(data_raw == '106'):
-        #     data = 'EPS Check Mode'
-        # elif(data_raw == '107'):
-        #     data = 'EPS Mode'
-        # elif(data_raw == '108'):
-        #     data = 'Self-Test Mode'
-        # elif(data_raw == '109'):
-        #     data = 'Idle Mode'
-        # elif(data_raw == '110'):
-        #     data = 'Standby Mode'
-        # elif(data_raw == '111'):
-        #     data = 'Pv Wake Up Bat Mode'
-        # elif(data_raw == '112'):
-        #     data = 'Gen Check Mode'
-        # elif(data_raw == '113'):
-        #     data = 'Gen Run Mode'
-        # else:
-        #     data = 'Unknown'
-
-        data = inverter_status(data_raw)
-
-        return data
+    def native_value(self):
+        return self.description.value(self.solax_cloud, self.scheduler)
 
     @property
-    def icon(self):
-        return 'mdi:solar-power'
+    def extra_state_attributes(self):
+        if self.description.key == 'api_errors':
+            return dict(self.solax_cloud.metrics.errors)
+        return None
 
     @property
-    def friendly_name(self):
-        return 'Inverter Status'
-
-    @Throttle(MIN_TIME_BETWEEN_UPDATES)
-    def update(self):
-        self.solax_cloud.get_data()
-
-# Update time
-class UpdateTimeSensor(Entity):
-    # The timestamp of the last data update (as a datetime)
-    def __init__(self, hass, solax_cloud):
-        self._name = solax_cloud.inverter_name + ' Update time'
-        self.hass = hass
-        self.solax_cloud = solax_cloud
+    def native_unit_of_measurement(self):
+        return self.description.unit
 
     @property
-    def name(self):
-        return self._name
+    def device_class(self):
+        return UNIT_CLASSES.get(self.description.unit, NO_CLASSES)[0]
 
     @property
-    def state(self):
-        data = self.solax_cloud.data.get('uploadTime')
-        return float('nan') if data is None else data
+    def state_class(self):
+        if self.description.counter:
+            return SensorStateClass.TOTAL_INCREASING
+        return SensorStateClass.MEASUREMENT
 
     @property
     def icon(self):
-        return 'mdi:clock-outline'
+        return self.description.icon
 
     @property
-    def friendly_name(self):
-        return 'Data Last Updated'
-
-    @Throttle(MIN_TIME_BETWEEN_UPDATES)
-    def update(self):
-        self.solax_cloud.get_data()
-
-# Inverter.DC.Battery.power.total
-class BatPowerSensor(Entity):
-    # ?? Current battery power storage (in watts) ??
-    def __init__(self, hass, solax_cloud):
-        self._name = solax_cloud.inverter_name + ' Battery power'
-        self.hass = hass
-        self.solax_cloud = solax_cloud
+    def entity_category(self):
+        return EntityCategory.DIAGNOSTIC
 
     @property
-    def name(self):
-        return self._name
+    def should_poll(self):
+        return False
 
-    @property
-    def state(self):
-        data = self.solax_cloud.data.get('batpower')
-        return float('nan') if data is None else data
+    async def async_added_to_hass(self):
+        self.async_on_remove(
+            self.coordinator.async_add_fetch_listener(self.async_write_ha_state))
 
-    @property
-    def unit_of_measurement(self):
-        return 'W'
 
-    @property
-    def icon(self):
-        return 'mdi:battery'
+# Describes one fleet aggregate sensor
+FleetDescription = namedtuple('FleetDescription', ('key', 'name', 'unit', 'icon'))
 
-    @property
-    def friendly_name(self):
-        return 'Battery Power'
+FLEET_NAME = 'SolaxCloud Fleet'
 
-    @Throttle(MIN_TIME_BETWEEN_UPDATES)
-    def update(self):
-        self.solax_cloud.get_data()
-
-# Inverter.DC.PV.power.MPPT1
-class PowerDC1Sensor(Entity):
-    # ?? -- (in watts) ??
-    def __init__(self, hass, solax_cloud):
-        self._name = solax_cloud.inverter_name + ' MPPT 1'
-        self.hass = hass
-        self.solax_cloud = solax_cloud
-
-    @property
-    def name(self):
-        return self._name
-
-    @property
-    def state(self):
-        data = self.solax_cloud.data.get('powerdc1')
-        return float('nan') if data is None else data
-
-    @property
-    def unit_of_measurement(self):
-        return 'W'
-
-    @property
-    def icon(self):
-        return 'mdi:solar-power'
-
-    @Throttle(MIN_TIME_BETWEEN_UPDATES)
-    def update(self):
-        self.solax_cloud.get_data()
+FLEET_TYPES = (
+    FleetDescription('yieldtotal', 'Total Yield', 'kWh', 'mdi:solar-power'),
+    FleetDescription('yieldtoday', 'Daily Yield', 'kWh', 'mdi:solar-power'),
+    FleetDescription('feedinpower', 'Grid Power Total', 'W', 'mdi:transmission-tower'),
+    FleetDescription('batpower', 'Battery power', 'W', 'mdi:battery'),
+    FleetDescription('soc', 'State of charge', '%', 'mdi:battery'),
+)
 
-# Inverter.DC.PV.power.MPPT2
-class PowerDC2Sensor(Entity):
-    # ?? -- (in watts) ??
-    def __init__(self, hass, solax_cloud):
-        self._name = solax_cloud.inverter_name + ' MPPT 2'
+# Statistics kept for the recorder: hourly means of the readings and sums of
+# the meters. The daily yield is left out, the total yield covers it.
+STATISTICS_FIELDS = {
+    **{description.key: (description.name, description.unit)
+       for description in SENSOR_TYPES
+       if description.unit in ROLLING_UNITS
+       or description.unit == METER_UNIT and description.key != 'yieldtoday'},
+    **{description.key: (description.name, METER_UNIT) for description in ENERGY_TYPES},
+}
+FLEET_STATISTICS_FIELDS = {
+    **{key: field for key, field in STATISTICS_FIELDS.items() if field[1] == METER_UNIT},
+    **{description.key: (description.name, description.unit)
+       for description in FLEET_TYPES if description.unit != METER_UNIT},
+}
+
+# Sum (or capacity weighted SoC) over every inverter, updated incrementally
+# as each inverter's snapshot arrives
+class SolaxCloudFleetSensor(SensorEntity):
+    def __init__(self, hass, fleet, description):
         self.hass = hass
-        self.solax_cloud = solax_cloud
+        self.fleet = fleet
+        self.description = description
+        self._name = f'{FLEET_NAME} {description.name}'
 
     @property
     def name(self):
         return self._name
 
     @property
-    def state(self):
-        data = self.solax_cloud.data.get('powerdc2')
-        return float('nan') if data is None else data
+    def available(self):
+        return self.description.key != 'soc' or self.fleet.soc is not None
 
     @property
-    def unit_of_measurement(self):
-        return 'W'
+    def native_value(self):
+        if self.description.key == 'soc':
+            soc = self.fleet.soc
+            return None if soc is None else round(soc, 1)
+        # Running totals pick up float noise, round it away
+        return round(self.fleet.totals[self.description.key], 2)
 
     @property
-    def icon(self):
-        return 'mdi:solar-power'
-
-    @Throttle(MIN_TIME_BETWEEN_UPDATES)
-    def update(self):
-        self.solax_cloud.get_data()
-
-# Inverter.DC.PV.power.MPPT3
-class PowerDC2Sensor(Entity):
-    # ?? -- (in watts) ??
-    def __init__(self, hass, solax_cloud):
-        self._name = solax_cloud.inverter_name + ' MPPT 3'
-        self.hass = hass
-        self.solax_cloud = solax_cloud
-
-    @property
-    def name(self):
-        return self._name
+    def native_unit_of_measurement(self):
+        return self.description.unit
 
     @property
-    def state(self):
-        data = self.solax_cloud.data.get('powerdc3')
-        return float('nan') if data is None else data
+    def device_class(self):
+        return UNIT_CLASSES[self.description.unit][0]
 
+    # The fleet's yields are no meters: an inverter joining makes them jump
+    # and each inverter's daily yield resets at its own midnight. Their only
+    # statistics are the integration's, which add up each inverter's growth.
     @property
-    def unit_of_measurement(self):
-        return 'W'
+    def state_class(self):
+        if self.fleet.statistics is not None or self.description.unit == METER_UNIT:
+            return None
+        return UNIT_CLASSES[self.description.unit][1]
 
     @property
     def icon(self):
-        return 'mdi:solar-power'
-
-    @Throttle(MIN_TIME_BETWEEN_UPDATES)
-    def update(self):
-        self.solax_cloud.get_data()
-
-# Inverter.DC.PV.power.MPPT4
-class PowerDC2Sensor(Entity):
-    # ?? -- (in watts) ??
-    def __init__(self, hass, solax_cloud):
-        self._name = solax_cloud.inverter_name + ' MPPT 4'
-        self.hass = hass
-        self.solax_cloud = solax_cloud
-
-    @property
-    def name(self):
-        return self._name
+        return self.description.icon
 
     @property
-    def state(self):
-        data = self.solax_cloud.data.get('powerdc4')
-        return float('nan') if data is None else data
-
-    @property
-    def unit_of_measurement(self):
-        return 'W'
-
-    @property
-    def icon(self):
-        return 'mdi:solar-power'
+    def should_poll(self):
+        return False
 
-    @Throttle(MIN_TIME_BETWEEN_UPDATES)
-    def update(self):
-        self.solax_cloud.get_data()        
\ No newline at end of file
+    async def async_added_to_hass(self):
+        self.async_on_remove(
+            self.fleet.async_add_listener(self.async_write_ha_state, self.description.key))
@@ -0,0 +1,148 @@
+"""Parsed, immutable snapshot of a SolaxCloud realtime payload."""
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+# Converts Inverter Type Code into Inverter Type (Table 4)
+INVERTER_TYPES = {
+    '1'  : 'X1-LX',
+    '2'  : 'X-Hybrid',
+    '3'  : 'X1-Hybrid/Fit',
+    '4'  : 'X1-Boost/Air/Mini',
+    '5'  : 'X3-Hybrid/Fit',
+    '6'  : 'X3-20K/30K',
+    '7'  : 'X3-MIC/PRO',
+    '8'  : 'X1-Smart',
+    '9'  : 'X1-AC',
+    '10' : 'A1-Hybrid',
+    '11' : 'A1-Fit',
+    '12' : 'A1-Grid',
+    '13' : 'J1-ESS',
+    '14' : 'X3-Hybrid-G4',
+    '15' : 'X1-Hybrid-G4',
+    '16' : 'X3-MIC/PRO-G2',
+    '17' : 'X1-SPT',
+    '18' : 'X1-Boost/Mini-G4',
+    '19' : 'A1-HYB-G2',
+    '20' : 'A1-AC-G2',
+    '21' : 'A1-SMT-G2',
+    '22' : 'X3-FTH',
+    '23' : 'X3-MGA-G2',
+}
+
+# Converts Status Code into Inverter Status (Table 5)
+INVERTER_STATUSES = {
+    '100' : 'Wait Mode',
+    '101' : 'Check Mode',
+    '102' : 'Normal Mode',
+    '103' : 'Fault Mode',
+    '104' : 'Permanent Fault Mode',
+    '105' : 'Update Mode',
+    '106' : 'EPS Check Mode',
+    '107' : 'EPS Mode',
+    '108' : 'Self-Test Mode',
+    '109' : 'Idle Mode',
+    '110' : 'Standby Mode',
+    '111' : 'Pv Wake Up Bat Mode',
+    '112' : 'Gen Check Mode',
+    '113' : 'Gen Run Mode',
+}
+
+UNKNOWN = 'Unknown'
+
+# Inverter types without battery storage (Table 4). Their payloads can carry
+# the storage items as zeros, which mean nothing.
+GRID_TIED_TYPES = ('4', '6', '7', '8', '16', '18', '22', '23')
+
+# Numeric API items (Table 3)
+NUMERIC_FIELDS = (
+    'acpower', 'yieldtoday', 'yieldtotal', 'feedinpower', 'feedinenergy',
+    'consumeenergy', 'feedinpowerM2', 'soc', 'peps1', 'peps2', 'peps3',
+    'batpower', 'powerdc1', 'powerdc2', 'powerdc3', 'powerdc4',
+)
+API_FIELDS = NUMERIC_FIELDS + ('inverterType', 'inverterStatus', 'uploadTime')
+# Items only an inverter with battery storage reports
+STORAGE_FIELDS = ('soc', 'batpower', 'peps1', 'peps2', 'peps3')
+
+
+# The API reports uploadTime as 'YYYY-MM-DD HH:MM:SS' on the inverter's clock
+def parse_upload_time(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
+    except (TypeError, ValueError):
+        return None
+
+
+def _number(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _code(value):
+    return None if value is None else str(value)
+
+
+class Snapshot(NamedTuple):
+    # One fetch, parsed once so that reading a field is a single attribute
+    # access. A field the payload did not report is None. Field names match
+    # the API items, plus the decoded codes and the parsed upload time.
+    acpower: Optional[float] = None
+    yieldtoday: Optional[float] = None
+    yieldtotal: Optional[float] = None
+    feedinpower: Optional[float] = None
+    feedinenergy: Optional[float] = None
+    consumeenergy: Optional[float] = None
+    feedinpowerM2: Optional[float] = None
+    soc: Optional[float] = None
+    peps1: Optional[float] = None
+    peps2: Optional[float] = None
+    peps3: Optional[float] = None
+    batpower: Optional[float] = None
+    powerdc1: Optional[float] = None
+    powerdc2: Optional[float] = None
+    powerdc3: Optional[float] = None
+    powerdc4: Optional[float] = None
+    inverterType: Optional[str] = None
+    inverterStatus: Optional[str] = None
+    uploadTime: Optional[str] = None
+    inverter_type: str = UNKNOWN
+    inverter_status: str = UNKNOWN
+    upload_time: Optional[datetime] = None
+    # When the payload was retrieved, on our clock
+    fetched_at: Optional[datetime] = None
+
+    @classmethod
+    def from_result(cls, result, fetched_at=None):
+        values = {field: _number(result.get(field)) for field in NUMERIC_FIELDS}
+        type_code = _code(result.get('inverterType'))
+        status_code = _code(result.get('inverterStatus'))
+        upload_time = result.get('uploadTime')
+        return cls(
+            **values,
+            inverterType=type_code,
+            inverterStatus=status_code,
+            uploadTime=upload_time,
+            inverter_type=INVERTER_TYPES.get(type_code, UNKNOWN),
+            inverter_status=INVERTER_STATUSES.get(status_code, UNKNOWN),
+            upload_time=parse_upload_time(upload_time),
+            fetched_at=fetched_at,
+        )
+
+    # Back to the API items of a payload, as the cache persists them
+    def to_result(self):
+        return {field: getattr(self, field) for field in API_FIELDS}
+
+
+# Numeric API items the inverter actually reports in a snapshot
+def reported_fields(snapshot):
+    fields = {field for field in NUMERIC_FIELDS if getattr(snapshot, field) is not None}
+    if snapshot.inverterType in GRID_TIED_TYPES:
+        fields.difference_update(STORAGE_FIELDS)
+    return fields
+
+
+# Before the first successful fetch
+EMPTY_SNAPSHOT = Snapshot()
@@ -0,0 +1,152 @@
+"""Hourly long-term statistics of SolaxCloud inverters, imported into the recorder."""
+from datetime import datetime
+
+from homeassistant.components.recorder.statistics import async_add_external_statistics
+from homeassistant.core import callback
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util
+
+from .const import DOMAIN, STORAGE_SAVE_DELAY, STORAGE_VERSION
+
+# Meters are summed; every other unit is a reading with a mean, min and max
+METER_UNIT = 'kWh'
+
+
+# Start of the hour a time on the inverter's clock, its local time, falls in.
+# Hours start on the hour in UTC, which in some time zones is not on the hour
+# locally.
+def utc_hour(local_time):
+    hour = dt_util.as_utc(local_time.replace(tzinfo=dt_util.DEFAULT_TIME_ZONE))
+    return hour.replace(minute=0, second=0, microsecond=0)
+
+
+# Get the statistics of the whole fleet, creating them for the first inverter,
+# and the task restoring them
+@callback
+def async_get_fleet_statistics(hass, name, fields):
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    if 'fleet_statistics' not in domain_data:
+        statistics = HourlyStatistics(hass, 'fleet', name, fields)
+        domain_data['fleet_statistics'] = (
+            statistics, hass.async_create_task(statistics.async_restore()))
+    return domain_data['fleet_statistics']
+
+
+class HourlyStatistics:
+    # Aggregates uploads into hourly statistics as they arrive, and imports
+    # each hour into the recorder as external statistics once an upload of a
+    # later hour shows it is complete. Readings get a mean, min and max over
+    # the uploads of the hour. Meters get a sum: the growth of every source's
+    # meter added up, so inverters joining the fleet or replaced meters do not
+    # show up as energy. Samples come from one or more sources, the inverters,
+    # and each source's uploads are taken once, in order. The open hour and
+    # the meters are persisted, so a restart does not cut an hour short.
+    def __init__(self, hass, key, name, fields):
+        self.hass = hass
+        # Field: (name, unit)
+        self.fields = fields
+        self.sums = {field: 0.0 for field, (_, unit) in fields.items() if unit == METER_UNIT}
+        self.hour = None
+        # Field: [count, total, min, max] over the open hour
+        self._readings = {}
+        # Source: its last upload time and meter readings
+        self._sources = {}
+        self._metadata = {
+            field: {
+                'has_mean': unit != METER_UNIT,
+                'has_sum': unit == METER_UNIT,
+                'name': f'{name} {field_name}',
+                'source': DOMAIN,
+                'statistic_id': f'{DOMAIN}:{key.lower()}_{field.lower()}',
+                'unit_of_measurement': unit,
+            } for field, (field_name, unit) in fields.items()}
+        self.store = Store(hass, STORAGE_VERSION, f'{DOMAIN}.{key}.statistics')
+
+    async def async_restore(self):
+        stored = await self.store.async_load()
+        if stored:
+            self.sums.update(stored['sums'])
+            self._readings = stored['readings']
+            self._sources = stored['sources']
+            if stored['hour'] is not None:
+                self.hour = datetime.fromisoformat(stored['hour'])
+
+    def _data_to_store(self):
+        return {'sums': self.sums,
+                'hour': self.hour and self.hour.isoformat(),
+                'readings': self._readings,
+                'sources': self._sources}
+
+    # Account for an upload of `source` at `upload_time`, the inverter's local
+    # time, with `values` by field. Returns whether it was new.
+    def add(self, source, upload_time, values):
+        if upload_time is None:
+            return False
+        timestamp = upload_time.isoformat()
+        last = self._sources.setdefault(source, {'time': None, 'meters': {}})
+        if last['time'] is not None and timestamp <= last['time']:
+            return False
+        last['time'] = timestamp
+
+        hour = utc_hour(upload_time)
+        # Uploads of a source lagging behind the others count towards the
+        # open hour
+        if self.hour is None:
+            self.hour = hour
+        elif hour > self.hour:
+            self._import_hour()
+            self.hour = hour
+
+        meters = last['meters']
+        for field in self.fields:
+            value = values.get(field)
+            if value is None:
+                continue
+            if field in self.sums:
+                # A meter that went back was reset or replaced; it restarts
+                # from its new reading
+                previous = meters.get(field)
+                if previous is not None and value > previous:
+                    self.sums[field] += value - previous
+                meters[field] = value
+                continue
+            reading = self._readings.get(field)
+            if reading is None:
+                self._readings[field] = [1, value, value, value]
+            else:
+                reading[0] += 1
+                reading[1] += value
+                reading[2] = min(reading[2], value)
+                reading[3] = max(reading[3], value)
+        self.store.async_delay_save(self._data_to_store, STORAGE_SAVE_DELAY)
+        return True
+
+    # Import hourly readings of a meter of `source`, as (hour, reading), from
+    # before the open hour. Their sums continue into the ones kept since; later
+    # hours are left to the uploads. Returns the number of hours imported.
+    def import_meter(self, source, field, readings):
+        meters = self._sources.get(source, {}).get('meters', {})
+        if self.hour is None or field not in meters:
+            return 0
+        # The reading the sum started from
+        offset = meters[field] - self.sums[field]
+        rows = [{'start': hour, 'sum': round(reading - offset, 3)}
+                for hour, reading in readings if hour < self.hour]
+        if rows:
+            async_add_external_statistics(self.hass, self._metadata[field], rows)
+        return len(rows)
+
+    # Import the open hour, replacing whatever the recorder holds for it
+    def _import_hour(self):
+        metered = set().union(*(source['meters'] for source in self._sources.values()))
+        for field, metadata in self._metadata.items():
+            if field in metered:
+                row = {'start': self.hour, 'sum': round(self.sums[field], 3)}
+            elif field in self._readings:
+                count, total, minimum, maximum = self._readings[field]
+                row = {'start': self.hour, 'mean': total / count,
+                       'min': minimum, 'max': maximum}
+            else:
+                continue
+            async_add_external_statistics(self.hass, metadata, (row,))
+        self._readings = {}
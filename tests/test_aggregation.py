@@ -0,0 +1,140 @@
+"""Tests of the fleet totals, energy counters, rolling history and hourly statistics."""
+import asyncio
+import math
+import random
+
+from datetime import datetime, timedelta, timezone
+
+from homeassistant.core import HomeAssistant
+
+from .. import statistics
+from ..energy import EnergyIntegrator
+from ..fleet import SolaxCloudFleet
+from ..history import RingBuffer
+from ..snapshot import Snapshot
+from ..statistics import HourlyStatistics
+
+START = datetime(2026, 6, 1, 10, 0)
+
+
+# Run `test(hass)` with a Home Assistant instance configured in `config_dir`
+def _run_with_hass(config_dir, test):
+    async def run():
+        hass = HomeAssistant(str(config_dir))
+        try:
+            await test(hass)
+        finally:
+            await hass.async_stop(force=True)
+    asyncio.run(run())
+
+
+class _Batcher:
+    @staticmethod
+    def async_schedule(update_callback):
+        update_callback()
+
+
+class _Coordinator:
+    def __init__(self, **values):
+        self.data = Snapshot(**values)
+        self.update = None
+
+    def async_add_listener(self, update_callback):
+        self.update = update_callback
+        return lambda: None
+
+    def publish(self, **values):
+        self.data = Snapshot(**values)
+        self.update()
+
+
+def test_ring_buffer_matches_its_window():
+    buffer = RingBuffer(5)
+    rng = random.Random(1)
+    values = []
+    for _ in range(500):
+        value = None if rng.random() < 0.1 else rng.uniform(-100, 100)
+        values.append(value)
+        buffer.append(value)
+        window = [value for value in values[-5:] if value is not None]
+        if not window:
+            assert buffer.mean is None
+            continue
+        assert math.isclose(buffer.mean, sum(window) / len(window), abs_tol=1e-9)
+        assert buffer.min == min(window)
+        assert buffer.max == max(window)
+
+
+def test_fleet_applies_differences_and_holds_missing_items():
+    fleet = SolaxCloudFleet(_Batcher())
+    changed = []
+    fleet.async_add_listener(lambda: changed.append('yieldtotal'), 'yieldtotal')
+    first = _Coordinator(yieldtotal=100.0, feedinpower=500.0, soc=80.0)
+    second = _Coordinator(yieldtotal=50.0, feedinpower=-200.0, soc=20.0)
+    fleet.async_add_inverter(first, 3)
+    fleet.async_add_inverter(second, 1)
+    assert fleet.totals['yieldtotal'] == 150.0
+    assert fleet.totals['feedinpower'] == 300.0
+    assert fleet.soc == 65.0
+
+    changed.clear()
+    first.publish(yieldtotal=101.0, feedinpower=400.0, soc=80.0)
+    assert fleet.totals['yieldtotal'] == 151.0
+    assert fleet.totals['feedinpower'] == 200.0
+    assert changed == ['yieldtotal']
+
+    # An item missing from an upload keeps the inverter's last contribution
+    changed.clear()
+    first.publish(feedinpower=300.0, soc=80.0)
+    assert fleet.totals['yieldtotal'] == 151.0
+    assert changed == []
+
+
+def test_energy_splits_battery_power_where_it_changes_sign(tmp_path):
+    async def test(hass):
+        energy = EnergyIntegrator(hass, 'SN')
+        energy.update(Snapshot(upload_time=START, batpower=1200.0, powerdc1=2000.0))
+        assert energy.update(Snapshot(
+            upload_time=START + timedelta(minutes=5), batpower=-1200.0, powerdc1=1000.0))
+        # 1200 W falling linearly to 0 over 2.5 minutes, and on to -1200 W
+        assert math.isclose(energy.totals['battery_charge'], 0.025)
+        assert math.isclose(energy.totals['battery_discharge'], 0.025)
+        assert math.isclose(energy.totals['pv_energy'], 0.125)
+        # Nothing is known of the power over a gap, and an upload seen twice
+        # adds nothing
+        later = Snapshot(upload_time=START + timedelta(hours=1), batpower=1200.0, powerdc1=1000.0)
+        assert not energy.update(later)
+        assert not energy.update(later)
+        assert math.isclose(energy.totals['pv_energy'], 0.125)
+
+    _run_with_hass(tmp_path, test)
+
+
+def test_statistics_sum_the_growth_of_each_meter(tmp_path, monkeypatch):
+    imported = []
+    monkeypatch.setattr(statistics, 'async_add_external_statistics',
+                        lambda hass, metadata, rows: imported.append(
+                            (metadata['statistic_id'], *rows)))
+
+    async def test(hass):
+        fields = {'yieldtotal': ('Total Yield', 'kWh'), 'acpower': ('AC Power', 'W')}
+        hourly = HourlyStatistics(hass, 'fleet', 'Fleet', fields)
+        hourly.add('A', START, {'yieldtotal': 1000.0, 'acpower': 100.0})
+        hourly.add('B', START, {'yieldtotal': 50.0, 'acpower': 300.0})
+        hourly.add('A', START + timedelta(minutes=30), {'yieldtotal': 1002.0})
+        # A replaced meter restarts from its new reading
+        hourly.add('B', START + timedelta(minutes=30), {'yieldtotal': 0.5})
+        hourly.add('B', START + timedelta(minutes=40), {'yieldtotal': 1.5})
+        # An upload seen twice is taken once
+        assert not hourly.add('A', START + timedelta(minutes=30), {'yieldtotal': 1002.0})
+        hourly.add('A', START + timedelta(hours=1), {'yieldtotal': 1003.0})
+
+        hour = START.replace(tzinfo=timezone.utc)
+        assert sorted(imported) == [
+            ('solaxcloud:fleet_acpower', {'start': hour, 'mean': 200.0, 'min': 100.0,
+                                          'max': 300.0}),
+            ('solaxcloud:fleet_yieldtotal', {'start': hour, 'sum': 3.0}),
+        ]
+        assert hourly.sums['yieldtotal'] == 4.0
+
+    _run_with_hass(tmp_path, test)
@@ -0,0 +1,91 @@
+"""Tests of the poll scheduler's rate limiting and upload phases."""
+import bisect
+
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from ..const import API_RATE_LIMIT, API_RATE_PERIOD, UPLOAD_GRACE
+from ..scheduler import CallWindow, PollScheduler, UploadPhase
+
+PERIOD = API_RATE_PERIOD.total_seconds()
+
+
+# Calls let through by `window` to callers retrying as soon as it allows,
+# starting at once like a cold start with every inverter due
+def _greedy_calls(window, duration, callers=40):
+    calls = []
+    now = 0.0
+    while now < duration:
+        wait = window.try_consume(now)
+        if wait:
+            now += wait
+        else:
+            calls.append(now)
+            if len(calls) % callers == 0:
+                now += 1
+    return calls
+
+
+def _most_calls_in_a_period(calls):
+    return max(bisect.bisect_left(calls, start + PERIOD) - index
+               for index, start in enumerate(calls))
+
+
+def test_scheduler_stays_within_the_api_rate_limit():
+    calls = _greedy_calls(PollScheduler(None, 'token').window, 10 * PERIOD)
+    assert _most_calls_in_a_period(calls) <= API_RATE_LIMIT
+
+
+def test_window_allows_its_limit_per_period():
+    calls = _greedy_calls(CallWindow(8, PERIOD), 10 * PERIOD)
+    assert _most_calls_in_a_period(calls) == 8
+    assert len(calls) == 80
+
+
+def test_window_tells_how_long_to_wait():
+    window = CallWindow(2, PERIOD)
+    assert window.try_consume(0) == 0
+    assert window.try_consume(10) == 0
+    assert window.try_consume(20) == PERIOD - 20
+    assert window.try_consume(PERIOD) == 0
+
+
+START = datetime(2026, 6, 1, 6, 0)
+UPLOAD_PERIOD = timedelta(minutes=5)
+# How long an upload takes to show up in the API
+UPLOAD_DELAY = timedelta(seconds=20)
+
+
+# The snapshot an inverter uploading every UPLOAD_PERIOD from START shows at `now`
+def _snapshot(now):
+    uploads = (now - UPLOAD_DELAY - START) // UPLOAD_PERIOD
+    return SimpleNamespace(upload_time=START + uploads * UPLOAD_PERIOD)
+
+
+def test_phase_needs_more_than_one_period():
+    phase = UploadPhase()
+    # Last evening's upload, then the first of the morning
+    phase.observe(SimpleNamespace(upload_time=START - timedelta(hours=10)), START)
+    phase.observe(_snapshot(START + timedelta(minutes=1)), START + timedelta(minutes=1))
+    assert not phase.learned
+    phase.observe(_snapshot(START + timedelta(minutes=6)), START + timedelta(minutes=6))
+    assert not phase.learned
+    phase.observe(_snapshot(START + timedelta(minutes=11)), START + timedelta(minutes=11))
+    assert phase.learned
+    assert phase.next_upload(START + timedelta(minutes=11)) == START + timedelta(
+        minutes=15, seconds=60)
+
+
+def test_polls_on_the_phase_stay_just_after_the_uploads():
+    phase = UploadPhase()
+    now = START + timedelta(seconds=50)
+    for _ in range(3):
+        phase.observe(_snapshot(now), now)
+        now += UPLOAD_PERIOD
+    staleness = []
+    for _ in range(50):
+        now = phase.next_upload(now) + UPLOAD_GRACE
+        snapshot = _snapshot(now)
+        assert phase.observe(snapshot, now, on_phase=True)
+        staleness.append(now - snapshot.upload_time)
+    assert set(staleness) == {timedelta(seconds=50) + UPLOAD_GRACE}
@@ -0,0 +1,133 @@
+"""Backtest of the power nowcasts against captured SolaxCloud responses.
+
+Replays the uploads in capture files (see the `capture` option) through a
+PowerNowcast per inverter and, before learning from each upload, scores the
+estimate made for its time from the uploads before it. The nowcast is
+compared with persistence, holding the last upload, which is what the sensors
+show between uploads. The lower the confidence, the larger the error relative
+to the site's power should be. Uploads are on the inverter's clock, so give
+the time zone it is set to and the site's location. Run it with:
+
+    python -m custom_components.solaxcloud.tools.backtest solaxcloud_capture.jsonl* \\
+        --latitude 48.1 --longitude 11.6 --time-zone Europe/Berlin
+"""
+import argparse
+import time
+
+from datetime import datetime
+
+from homeassistant.util import dt as dt_util
+
+from ..capture import read_records
+from ..const import MAX_INTEGRATION_GAP
+from ..local import to_result
+from ..nowcast import NOWCAST_FIELDS, PowerNowcast
+from ..snapshot import Snapshot
+
+# Lower bounds of the confidence bins reported, in percent
+CONFIDENCE_BINS = (90, 75, 50, 0)
+
+
+# Every inverter's snapshots in the records, in the order they were fetched
+def snapshots(records):
+    for record in records:
+        fetched_at = datetime.fromisoformat(record['fetched_at'])
+        data = record['data']
+        if record['source'] == 'local':
+            try:
+                yield record['sn'], Snapshot.from_result(to_result(data, fetched_at), fetched_at)
+            except (ValueError, KeyError, TypeError, IndexError):
+                pass
+            continue
+        if not isinstance(data, dict) or data.get('success') != True:
+            continue
+        results = data.get('result')
+        for result in results if isinstance(results, list) else (results,):
+            if isinstance(result, dict):
+                sn = record['sn'] if record['source'] == 'cloud' else result.get('sn')
+                yield sn, Snapshot.from_result(result, fetched_at)
+
+
+class Backtest:
+    def __init__(self, latitude, longitude):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.nowcasts = {}
+        self.previous = {}
+        self.count = 0
+        self.errors = {field: 0.0 for field in NOWCAST_FIELDS}
+        self.persistence_errors = {field: 0.0 for field in NOWCAST_FIELDS}
+        # Lower bound: [count, error relative to the site's power, minutes ahead]
+        self.bins = {bound: [0, 0.0, 0.0] for bound in CONFIDENCE_BINS}
+        self.estimate_time = 0.0
+
+    def add(self, sn, snapshot):
+        nowcast = self.nowcasts.setdefault(sn, PowerNowcast(self.latitude, self.longitude))
+        if snapshot.upload_time is None or snapshot.acpower is None or snapshot.feedinpower is None:
+            return
+        when = dt_util.as_utc(snapshot.upload_time.replace(tzinfo=dt_util.DEFAULT_TIME_ZONE))
+        previous = self.previous.get(sn)
+        if (nowcast.ready and previous is not None and nowcast.observed_at < when
+                and when - nowcast.observed_at <= MAX_INTEGRATION_GAP):
+            start = time.perf_counter()
+            estimate = nowcast.estimate(when)
+            confidence = nowcast.confidence(when) * 100
+            self.estimate_time += time.perf_counter() - start
+            error = 0.0
+            reference = nowcast.reference_power
+            for field in NOWCAST_FIELDS:
+                actual = getattr(snapshot, field) or 0.0
+                self.errors[field] += abs(estimate[field] - actual)
+                self.persistence_errors[field] += abs((getattr(previous, field) or 0.0) - actual)
+                error += abs(estimate[field] - actual) / len(NOWCAST_FIELDS) / reference
+            self.count += 1
+            counts = self.bins[next(bound for bound in CONFIDENCE_BINS if confidence >= bound)]
+            counts[0] += 1
+            counts[1] += error
+            counts[2] += (when - nowcast.observed_at).total_seconds() / 60
+        if nowcast.update(snapshot):
+            self.previous[sn] = snapshot
+
+    def report(self):
+        print(f'{self.count} uploads of {len(self.nowcasts)} inverters scored, '
+              f'{self.estimate_time / max(self.count, 1) * 1e6:.1f} us per estimate')
+        if not self.count:
+            return
+        print(f'{"field":>12} | {"nowcast MAE W":>14} | {"persistence MAE W":>18} | {"skill":>6}')
+        for field in NOWCAST_FIELDS:
+            nowcast = self.errors[field] / self.count
+            persistence = self.persistence_errors[field] / self.count
+            skill = 1 - nowcast / persistence if persistence else 0.0
+            print(f'{field:>12} | {nowcast:14.1f} | {persistence:18.1f} | {skill:6.1%}')
+        print(f'{"confidence":>12} | {"uploads":>8} | {"error":>8} | {"minutes ahead":>13}')
+        upper = 100
+        for bound in CONFIDENCE_BINS:
+            count, error, minutes = self.bins[bound]
+            if count:
+                print(f'{f"{bound}-{upper}%":>12} | {count:8} | {error / count:8.1%} | '
+                      f'{minutes / count:13.1f}')
+            upper = bound
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('paths', nargs='+', help='capture files, rotated ones included')
+    parser.add_argument('--latitude', type=float, required=True)
+    parser.add_argument('--longitude', type=float, required=True)
+    parser.add_argument('--time-zone', default='UTC',
+                        help="time zone of the inverters' clocks")
+    args = parser.parse_args()
+
+    time_zone = dt_util.get_time_zone(args.time_zone)
+    if time_zone is None:
+        raise SystemExit(f'Unknown time zone {args.time_zone}')
+    dt_util.set_default_time_zone(time_zone)
+    records = sorted(read_records(args.paths), key=lambda record: record['fetched_at'])
+    backtest = Backtest(args.latitude, args.longitude)
+    for sn, snapshot in snapshots(records):
+        backtest.add(sn, snapshot)
+    backtest.report()
+
+
+if __name__ == '__main__':
+    main()
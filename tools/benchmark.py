@@ -0,0 +1,226 @@
+"""Fleet-scale benchmark of the SolaxCloud integration.
+
+Drives SolaxCloud instances, their coordinators and sensor entities against a
+local API stand-in (see mock_server) and reports, per fleet size, the poll
+latency percentiles, CPU time, wall time and state writes per poll cycle, peak
+memory and the API calls per hour the scheduler makes on a shared token. Each
+size is run with entity updates batched per cycle and applied one at a time.
+Run it with:
+
+    python -m custom_components.solaxcloud.tools.benchmark --sizes 1 50 500
+"""
+import argparse
+import asyncio
+import os
+import socket
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import aiohttp
+
+from homeassistant.core import HomeAssistant
+
+from ..api import SolaxCloud
+from ..coordinator import SolaxCloudCoordinator, async_get_update_batcher
+from ..fleet import SolaxCloudFleet
+from ..scheduler import async_get_scheduler
+from ..sensor import FLEET_TYPES, SENSOR_TYPES, SolaxCloudFleetSensor, SolaxCloudSensor
+from .mock_server import API_PATH, STATS_PATH
+
+
+# Nearest-rank percentile of a list of samples
+def percentile(samples, fraction):
+    if not samples:
+        return float('nan')
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class MockServerProcess:
+    # Runs the API stand-in in its own process, so its CPU time and memory
+    # are not counted against the integration
+    def __init__(self, *options):
+        self.options = [str(option) for option in options]
+        self.port = free_port()
+        self.base_url = f'http://127.0.0.1:{self.port}'
+        self.process = None
+
+    async def __aenter__(self):
+        self.process = await asyncio.create_subprocess_exec(
+            sys.executable, '-m', f'{__package__}.mock_server',
+            '--port', str(self.port), *self.options,
+            env={**os.environ, 'PYTHONPATH': os.pathsep.join(sys.path)})
+        for _ in range(100):
+            try:
+                _, writer = await asyncio.open_connection('127.0.0.1', self.port)
+                writer.close()
+                break
+            except OSError:
+                await asyncio.sleep(0.1)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.process.terminate()
+        await self.process.wait()
+
+    async def stats(self, session):
+        async with session.get(self.base_url + STATS_PATH) as response:
+            return await response.json()
+
+
+class Fleet:
+    # `size` inverters with all of their sensors and the fleet aggregate,
+    # writing states to the state machine the way the entities do once added
+    # to Home Assistant
+    def __init__(self, hass, size, api_url, token=None):
+        self.hass = hass
+        self.coordinators = []
+        self.writes = 0
+        self.aggregate = SolaxCloudFleet(async_get_update_batcher(hass))
+        for description in FLEET_TYPES:
+            entity = SolaxCloudFleetSensor(hass, self.aggregate, description)
+            entity.entity_id = f'sensor.bench_fleet_{description.key.lower()}'
+            self.aggregate.async_add_listener(self._writer(entity), description.key)
+        for index in range(size):
+            solax_cloud = SolaxCloud(
+                hass, f'Bench {index}', token or f'bench-token-{index}',
+                f'BENCH{index:05d}', True, api_url=api_url)
+            coordinator = SolaxCloudCoordinator(hass, solax_cloud)
+            for description in SENSOR_TYPES:
+                entity = SolaxCloudSensor(hass, coordinator, description)
+                entity.entity_id = f'sensor.bench_{index}_{description.key.lower()}'
+                coordinator.async_add_listener(
+                    self._writer(entity), description.key)
+            self.aggregate.async_add_inverter(coordinator, 1)
+            self.coordinators.append(coordinator)
+
+    def _writer(self, entity):
+        def write_state():
+            self.writes += 1
+            self.hass.states.async_set(
+                entity.entity_id, entity.state, entity.extra_state_attributes)
+        return write_state
+
+    async def timed_refresh(self, coordinator):
+        start = time.perf_counter()
+        await coordinator.async_refresh()
+        return time.perf_counter() - start
+
+
+# Poll every inverter at once for a number of cycles. Each inverter uses its
+# own token here so the rate limit does not get in the way of measuring.
+# Entity updates are applied in one batch per cycle, or one at a time as the
+# fetches complete if `immediate`.
+async def bench_cycles(hass, size, args, immediate=False):
+    async_get_update_batcher(hass).immediate = immediate
+    async with MockServerProcess(
+            '--upload-period', args.cycle_pause, '--latency', args.latency,
+            '--jitter', args.jitter, '--rate-limit', 0) as mock:
+        # Traced from before the fleet is built, so its entities count
+        tracemalloc.start()
+        fleet = Fleet(hass, size, mock.base_url + API_PATH)
+        latencies = []
+        cpu_times = []
+        wall_times = []
+        writes = []
+        for _ in range(args.cycles):
+            await asyncio.sleep(args.cycle_pause)
+            writes_before = fleet.writes
+            cpu_start = time.process_time()
+            wall_start = time.perf_counter()
+            latencies += await asyncio.gather(
+                *(fleet.timed_refresh(c) for c in fleet.coordinators))
+            # Let the batch of entity updates run
+            await asyncio.sleep(0)
+            wall_times.append(time.perf_counter() - wall_start)
+            cpu_times.append(time.process_time() - cpu_start)
+            writes.append(fleet.writes - writes_before)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return {
+        'p50': percentile(latencies, 0.50) * 1000,
+        'p95': percentile(latencies, 0.95) * 1000,
+        'p99': percentile(latencies, 0.99) * 1000,
+        'cpu': sum(cpu_times) / len(cpu_times) * 1000,
+        'wall': sum(wall_times) / len(wall_times) * 1000,
+        'writes': sum(writes) / len(writes),
+        'memory': peak_memory / 2 ** 20,
+    }
+
+
+# Let the token's scheduler run the whole fleet for a while and extrapolate
+# the API calls it makes to an hour
+async def bench_schedule(hass, size, args, session):
+    async with MockServerProcess(
+            '--latency', args.latency, '--jitter', args.jitter) as mock:
+        fleet = Fleet(hass, size, mock.base_url + API_PATH, token=f'bench-fleet-{size}')
+        scheduler = async_get_scheduler(hass, f'bench-fleet-{size}')
+        scheduler.batch = args.batch
+        unregister = [scheduler.async_register(c) for c in fleet.coordinators]
+        await asyncio.sleep(args.duration)
+        for remove in unregister:
+            remove()
+        stats = await mock.stats(session)
+    hours = args.duration / 3600
+    return {
+        'calls': stats['calls'] / hours,
+        'rejected': stats['rejected'] / hours,
+    }
+
+
+async def async_main(args):
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass = HomeAssistant(config_dir)
+        results = {}
+        async with aiohttp.ClientSession() as session:
+            for size in args.sizes:
+                for updates, immediate in (('batched', False), ('immediate', True)):
+                    results[size, updates] = await bench_cycles(hass, size, args, immediate)
+                if args.duration:
+                    results[size, 'batched'].update(
+                        await bench_schedule(hass, size, args, session))
+        await hass.async_stop(force=True)
+
+    columns = ['inverters', 'updates', 'p50 ms', 'p95 ms', 'p99 ms', 'CPU ms/cycle',
+               'wall ms/cycle', 'writes/cycle', 'peak MiB']
+    if args.duration:
+        columns += ['calls/h', 'rejected/h']
+    print(' | '.join(f'{column:>12}' for column in columns))
+    for (size, updates), result in results.items():
+        row = [size, updates, result['p50'], result['p95'], result['p99'], result['cpu'],
+               result['wall'], result['writes'], result['memory']]
+        if args.duration and 'calls' in result:
+            row += [result['calls'], result['rejected']]
+        print(' | '.join(f'{value:>12.1f}' if isinstance(value, float)
+                         else f'{value:>12}' for value in row))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 50, 500],
+                        help='fleet sizes to benchmark')
+    parser.add_argument('--cycles', type=int, default=5,
+                        help='poll cycles per fleet size')
+    parser.add_argument('--cycle-pause', type=float, default=1.0,
+                        help='seconds between cycles, also the mock upload period')
+    parser.add_argument('--latency', type=float, default=0.2,
+                        help='mean mock API latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.05,
+                        help='standard deviation of the mock API latency')
+    parser.add_argument('--duration', type=float, default=120,
+                        help='seconds to run the scheduler for calls/h, 0 to skip')
+    parser.add_argument('--batch', action='store_true',
+                        help='let the scheduler fetch inverters in batches')
+    asyncio.run(async_main(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+"""Local stand-in for the SolaxCloud realtime API.
+
+Serves getRealtimeInfo.do with plausible, deterministic payloads per serial
+number and can inject latency, HTTP errors, `success: false` responses and
+rate-limit rejections. Several comma-separated serial numbers are answered
+with a list of results in one call, unless batching is disabled. It also
+answers like a WiFi dongle's local API, with the X1-Hybrid-G4 register layout,
+on POSTs to / whose password is a serial number. Run it with:
+
+    python -m custom_components.solaxcloud.tools.mock_server --port 8080
+"""
+import argparse
+import asyncio
+import math
+import random
+import time
+import zlib
+
+from collections import defaultdict, deque
+from datetime import datetime
+
+from aiohttp import web
+
+from ..const import API_RATE_LIMIT, API_RATE_PERIOD
+
+API_PATH = '/proxyApp/proxy/api/getRealtimeInfo.do'
+LOCAL_PATH = '/'
+STATS_PATH = '/stats'
+
+# Inverter models handed out to mock serial numbers (Table 4 codes)
+INVERTER_TYPES = ('3', '4', '5', '14', '15', '16')
+
+# 2020-01-01 in days since the Unix epoch
+INSTALL_EPOCH_DAY = 18262
+
+# Household load the mock sites draw, in watts
+HOUSE_LOAD = 450
+
+
+class MockSolaxCloud:
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0,
+                 failure_rate=0.0, rate_limit=API_RATE_LIMIT,
+                 rate_period=API_RATE_PERIOD.total_seconds(),
+                 upload_period=300, batch=True, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.failure_rate = failure_rate
+        self.rate_limit = rate_limit
+        self.rate_period = rate_period
+        self.upload_period = upload_period
+        self.batch = batch
+        self.random = random.Random(seed)
+        self.calls = 0
+        self.errors = 0
+        self.failures = 0
+        self.rejected = 0
+        self._recent_calls = defaultdict(deque)
+
+    # Deterministic payload of an inverter at its latest upload before `now`
+    def payload(self, sn, now):
+        seed = zlib.crc32(sn.encode())
+        site = random.Random(seed)
+        capacity = site.choice((3000, 5000, 8000, 10000))
+        battery = site.random() < 0.5
+        strings = site.choice((1, 2, 2, 3))
+        inverter_type = site.choice(INVERTER_TYPES)
+
+        # Each inverter uploads on the same period with its own phase
+        phase = seed % self.upload_period
+        upload = math.floor((now - phase) / self.upload_period) * self.upload_period + phase
+        upload_time = datetime.fromtimestamp(upload)
+        noise = random.Random(seed ^ int(upload)).uniform(0.85, 1.0)
+
+        # Daylight from 06:00 to 20:00 following a sine curve
+        hour = upload_time.hour + upload_time.minute / 60 + upload_time.second / 3600
+        angle = math.pi * min(max(hour - 6, 0), 14) / 14
+        sun = math.sin(angle)
+        acpower = round(capacity * sun * noise, 1)
+        yield_today = round(capacity / 1000 * 14 / math.pi * (1 - math.cos(angle)) * 0.25, 1)
+        # Installed some time since 2020, yielding 2.7 kWh per kWp a day
+        days = int(upload // 86400) - INSTALL_EPOCH_DAY - seed % 365
+        yield_total = round(days * capacity / 1000 * 2.7 + yield_today, 1)
+
+        surplus = acpower - HOUSE_LOAD
+        batpower = 0
+        if battery:
+            batpower = round(max(min(surplus, capacity / 2), -capacity / 4) * 0.5, 1)
+        feedinpower = round(surplus - batpower, 1)
+        powerdc = [round(acpower / strings * 1.03, 1)] * strings + [None] * (4 - strings)
+
+        return {
+            'inverterSN': sn,
+            'sn': sn,
+            'acpower': acpower,
+            'yieldtoday': yield_today,
+            'yieldtotal': yield_total,
+            'feedinpower': feedinpower,
+            'feedinenergy': round(yield_total * 0.55, 2),
+            'consumeenergy': round(days * HOUSE_LOAD * 24 / 1000 * 0.5, 2),
+            'feedinpowerM2': 0,
+            'soc': round(20 + 70 * sun) if battery else None,
+            'peps1': 0 if battery else None,
+            'peps2': None,
+            'peps3': None,
+            'inverterType': inverter_type,
+            'inverterStatus': '102' if sun > 0 else '100',
+            'uploadTime': upload_time.strftime('%Y-%m-%d %H:%M:%S'),
+            'batpower': batpower if battery else None,
+            'powerdc1': powerdc[0],
+            'powerdc2': powerdc[1],
+            'powerdc3': powerdc[2],
+            'powerdc4': powerdc[3],
+        }
+
+    # Sliding-window limit of calls per token, like the real API enforces
+    def _over_rate_limit(self, token, now):
+        if not self.rate_limit:
+            return False
+        calls = self._recent_calls[token]
+        while calls and calls[0] <= now - self.rate_period:
+            calls.popleft()
+        if len(calls) >= self.rate_limit:
+            return True
+        calls.append(now)
+        return False
+
+    async def handle_realtime_info(self, request):
+        self.calls += 1
+        if self.latency or self.jitter:
+            await asyncio.sleep(max(0, self.random.gauss(self.latency, self.jitter)))
+        now = time.time()
+        token = request.query.get('tokenId')
+        sn = request.query.get('sn')
+        if self.random.random() < self.error_rate:
+            self.errors += 1
+            return web.Response(status=500, text='Internal Server Error')
+        if self._over_rate_limit(token, now):
+            self.rejected += 1
+            return web.json_response(
+                {'success': False, 'exception': 'Mock: call rate limit exceeded',
+                 'result': None}, content_type='text/html')
+        if not token or not sn or self.random.random() < self.failure_rate:
+            self.failures += 1
+            return web.json_response(
+                {'success': False, 'exception': 'Mock: query failed',
+                 'result': None}, content_type='text/html')
+        sns = sn.split(',')
+        if len(sns) > 1 and not self.batch:
+            self.failures += 1
+            return web.json_response(
+                {'success': False, 'exception': 'Mock: sn not found',
+                 'result': None}, content_type='text/html')
+        result = self.payload(sn, now) if len(sns) == 1 else [self.payload(sn, now) for sn in sns]
+        # The real API also labels its JSON as text/html
+        return web.json_response(
+            {'success': True, 'exception': 'Query success!',
+             'result': result}, content_type='text/html')
+
+    # The payload as an X1-Hybrid-G4 dongle's Data registers
+    def registers(self, sn, now):
+        result = self.payload(sn, now)
+        data = [0] * 200
+
+        def word(index, value, scale=1):
+            data[index] = round((value or 0) / scale) & 0xFFFF
+
+        def double_word(index, value, scale=1):
+            value = round((value or 0) / scale) & 0xFFFFFFFF
+            data[index], data[index + 1] = value & 0xFFFF, value >> 16
+
+        word(2, result['acpower'])
+        word(8, result['powerdc1'])
+        word(9, result['powerdc2'])
+        word(10, int(result['inverterStatus']) - 100)
+        double_word(11, result['yieldtotal'], 0.1)
+        word(13, result['yieldtoday'], 0.1)
+        word(16, result['batpower'])
+        word(18, result['soc'])
+        word(32, result['feedinpower'])
+        double_word(34, result['feedinenergy'], 0.01)
+        double_word(36, result['consumeenergy'], 0.01)
+        return data
+
+    async def handle_local(self, request):
+        self.calls += 1
+        if self.latency or self.jitter:
+            await asyncio.sleep(max(0, self.random.gauss(self.latency, self.jitter)))
+        form = await request.post()
+        sn = form.get('pwd')
+        if form.get('optType') != 'ReadRealTimeData' or not sn:
+            return web.Response(status=401, text='Unauthorized')
+        if self.random.random() < self.error_rate:
+            self.errors += 1
+            return web.Response(status=500, text='Internal Server Error')
+        return web.json_response(
+            {'sn': sn, 'ver': '3.006.04', 'type': 15,
+             'Data': self.registers(sn, time.time()),
+             'Information': [5.0, 15, sn, 8, 1.23, 0, 1.08, 1.03, 0, 1]},
+            content_type='text/html')
+
+    async def handle_stats(self, request):
+        return web.json_response({
+            'calls': self.calls,
+            'errors': self.errors,
+            'failures': self.failures,
+            'rejected': self.rejected,
+        })
+
+    def make_app(self):
+        app = web.Application()
+        app.router.add_get(API_PATH, self.handle_realtime_info)
+        app.router.add_get(STATS_PATH, self.handle_stats)
+        app.router.add_post(LOCAL_PATH, self.handle_local)
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='mean response latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='standard deviation of the latency in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='fraction of calls answered with HTTP 500')
+    parser.add_argument('--failure-rate', type=float, default=0.0,
+                        help='fraction of calls answered with success: false')
+    parser.add_argument('--rate-limit', type=int, default=API_RATE_LIMIT,
+                        help='calls per token per minute, 0 for unlimited')
+    parser.add_argument('--upload-period', type=float, default=300,
+                        help='seconds between inverter uploads')
+    parser.add_argument('--no-batch', action='store_true',
+                        help='reject requests for several serial numbers')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    mock = MockSolaxCloud(
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        failure_rate=args.failure_rate, rate_limit=args.rate_limit,
+        upload_period=args.upload_period, batch=not args.no_batch, seed=args.seed)
+    web.run_app(mock.make_app(), host=args.host, port=args.port,
+                print=None, access_log=None)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""Accelerated replay of captured SolaxCloud responses.
+
+Feeds the records of capture files (see the `capture` option) back through
+SolaxCloud, the coordinators, energy counters, fleet aggregate and sensor
+entities of every captured inverter, in the order they were fetched. Replays
+as fast as possible by default, to load-test and profile the update path
+offline against real traffic; --speed 60 replays an hour a minute instead.
+Run it with:
+
+    python -m custom_components.solaxcloud.tools.replay solaxcloud_capture.jsonl*
+"""
+import argparse
+import asyncio
+import cProfile
+import pstats
+import tempfile
+import time
+
+from datetime import datetime
+
+from homeassistant.core import HomeAssistant
+
+from ..api import SolaxCloud
+from ..capture import read_records
+from ..coordinator import SolaxCloudCoordinator, async_get_update_batcher
+from ..energy import EnergyIntegrator
+from ..fleet import SolaxCloudFleet
+from ..history import InverterHistory
+from ..local import to_result
+from ..sensor import (
+    ENERGY_TYPES,
+    FLEET_TYPES,
+    SENSOR_TYPES,
+    SolaxCloudEnergySensor,
+    SolaxCloudFleetSensor,
+    SolaxCloudSensor,
+)
+
+
+class ReplayFleet:
+    # Every inverter found in the capture, set up like the platform does with
+    # all of its sensors, writing states to the state machine
+    def __init__(self, hass, history):
+        self.hass = hass
+        self.history = history
+        self.coordinators = {}
+        self.writes = 0
+        self.aggregate = SolaxCloudFleet(async_get_update_batcher(hass))
+        for description in FLEET_TYPES:
+            self._add_entity(SolaxCloudFleetSensor(hass, self.aggregate, description),
+                             f'fleet_{description.key}', self.aggregate, description.key)
+
+    def coordinator(self, sn):
+        if sn not in self.coordinators:
+            solax_cloud = SolaxCloud(self.hass, sn, 'replay', sn, True)
+            coordinator = SolaxCloudCoordinator(self.hass, solax_cloud)
+            energy = coordinator.energy = EnergyIntegrator(self.hass, sn)
+            coordinator.async_add_listener(lambda: energy.update(coordinator.data))
+            if self.history:
+                history = coordinator.history = InverterHistory(self.history)
+                coordinator.async_add_listener(lambda: history.append(coordinator.data))
+            for description in SENSOR_TYPES:
+                self._add_entity(SolaxCloudSensor(self.hass, coordinator, description),
+                                 f'{sn}_{description.key}', coordinator, description.key)
+            for description in ENERGY_TYPES:
+                self._add_entity(SolaxCloudEnergySensor(self.hass, coordinator, description),
+                                 f'{sn}_{description.key}', coordinator, 'uploadTime')
+            self.aggregate.async_add_inverter(coordinator, 1)
+            self.coordinators[sn] = coordinator
+        return self.coordinators[sn]
+
+    def _add_entity(self, entity, object_id, source, key):
+        entity.entity_id = f'sensor.replay_{object_id.lower()}'
+
+        def write_state():
+            self.writes += 1
+            self.hass.states.async_set(
+                entity.entity_id, entity.state, entity.extra_state_attributes)
+
+        source.async_add_listener(write_state, key)
+
+    # Apply one captured record. Returns the number of failed fetches in it.
+    def apply(self, record):
+        fetched_at = datetime.fromisoformat(record['fetched_at'])
+        data = record['data']
+        if record['source'] == 'cloud':
+            coordinator = self.coordinator(record['sn'])
+            return not coordinator.async_replay_response(data, record['latency'], fetched_at)
+        if record['source'] == 'local':
+            coordinator = self.coordinator(record['sn'])
+            try:
+                result = to_result(data, fetched_at)
+            except (ValueError, KeyError, TypeError, IndexError) as e:
+                return not coordinator.async_set_result(None, repr(e), fetched_at)
+            return not coordinator.async_set_result(result, fetched_at=fetched_at)
+        # A batch answers for several inverters at once
+        failed = 0
+        results = data.get('result') if isinstance(data, dict) else None
+        for result in results if isinstance(results, list) else ():
+            coordinator = self.coordinator(result.get('sn'))
+            failed += not coordinator.async_set_result(result, fetched_at=fetched_at)
+        return failed
+
+
+async def async_replay(hass, records, args):
+    fleet = ReplayFleet(hass, args.history)
+    failed = 0
+    previous = None
+    for record in records:
+        if args.speed and previous is not None:
+            gap = datetime.fromisoformat(record['fetched_at']) - previous
+            await asyncio.sleep(max(gap.total_seconds(), 0) / args.speed)
+        previous = datetime.fromisoformat(record['fetched_at'])
+        failed += fleet.apply(record)
+        # Let the batch of entity updates run
+        await asyncio.sleep(0)
+    return fleet, failed
+
+
+async def async_main(args):
+    records = sorted(read_records(args.paths), key=lambda record: record['fetched_at'])
+    if not records:
+        raise SystemExit('No records in the capture files')
+
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass = HomeAssistant(config_dir)
+        profiler = cProfile.Profile() if args.profile else None
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        if profiler:
+            profiler.enable()
+        fleet, failed = await async_replay(hass, records, args)
+        if profiler:
+            profiler.disable()
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        await hass.async_stop(force=True)
+
+    span = (datetime.fromisoformat(records[-1]['fetched_at'])
+            - datetime.fromisoformat(records[0]['fetched_at']))
+    print(f'{len(records)} records of {len(fleet.coordinators)} inverters over {span}')
+    print(f'replayed in {wall:.2f} s ({span.total_seconds() / wall:.0f}x real time), '
+          f'{len(records) / wall:.0f} records/s, CPU {cpu:.2f} s')
+    print(f'{fleet.writes} state writes, {failed} failed fetches')
+    if profiler:
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(args.profile)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('paths', nargs='+', help='capture files, rotated ones included')
+    parser.add_argument('--speed', type=float, default=0,
+                        help='replay speed relative to real time, 0 for as fast as possible')
+    parser.add_argument('--history', type=int, default=0,
+                        help='uploads kept for rolling statistics, as the history option')
+    parser.add_argument('--profile', type=int, default=0, metavar='N',
+                        help='profile the replay and print the N costliest functions')
+    asyncio.run(async_main(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
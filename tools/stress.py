@@ -0,0 +1,97 @@
+"""Concurrency stress test of SolaxCloud snapshot publishing.
+
+Writer threads keep publishing snapshots, and simulated failed fetches, while
+reader threads read them the way entities do. Every published snapshot is
+internally consistent: all numeric fields and fetched_at encode the same
+sequence number. A reader that ever sees mixed sequence numbers, or the empty
+snapshot after data was first published, counts a violation. Run it with:
+
+    python -m custom_components.solaxcloud.tools.stress --seconds 10
+"""
+import argparse
+import asyncio
+import tempfile
+import threading
+
+from datetime import datetime, timedelta
+
+from homeassistant.core import HomeAssistant
+
+from ..api import SolaxCloud
+from ..snapshot import EMPTY_SNAPSHOT, NUMERIC_FIELDS, Snapshot
+
+EPOCH = datetime(2020, 1, 1)
+
+
+def make_snapshot(sequence):
+    result = dict.fromkeys(NUMERIC_FIELDS, sequence)
+    result['uploadTime'] = (EPOCH + timedelta(seconds=sequence)).strftime('%Y-%m-%d %H:%M:%S')
+    return Snapshot.from_result(result, EPOCH + timedelta(seconds=sequence))
+
+
+def writer(solax_cloud, stop, counter, lock):
+    while not stop.is_set():
+        with lock:
+            counter[0] += 1
+            sequence = counter[0]
+        if sequence % 7:
+            solax_cloud.publish(make_snapshot(sequence))
+        else:
+            solax_cloud.failures += 1
+
+
+def reader(solax_cloud, stop, published, results):
+    reads = violations = 0
+    while not stop.is_set():
+        snapshot = solax_cloud.snapshot
+        reads += 1
+        if snapshot is EMPTY_SNAPSHOT:
+            if published.is_set():
+                violations += 1
+            continue
+        published.set()
+        sequence = snapshot.acpower
+        if (any(getattr(snapshot, field) != sequence for field in NUMERIC_FIELDS)
+                or snapshot.fetched_at != EPOCH + timedelta(seconds=sequence)
+                or snapshot.upload_time != snapshot.fetched_at):
+            violations += 1
+    results.append((reads, violations))
+
+
+async def async_main(args):
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass = HomeAssistant(config_dir)
+        solax_cloud = SolaxCloud(hass, 'Stress', 'stress-token', 'STRESS0001', True)
+        stop = threading.Event()
+        published = threading.Event()
+        lock = threading.Lock()
+        counter = [0]
+        results = []
+        threads = [threading.Thread(target=writer, args=(solax_cloud, stop, counter, lock))
+                   for _ in range(args.writers)]
+        threads += [threading.Thread(target=reader, args=(solax_cloud, stop, published, results))
+                    for _ in range(args.readers)]
+        for thread in threads:
+            thread.start()
+        await asyncio.sleep(args.seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        await hass.async_stop(force=True)
+
+    reads = sum(reads for reads, _ in results)
+    violations = sum(violations for _, violations in results)
+    print(f'{counter[0]} writes, {reads} reads, {violations} inconsistent reads')
+    return violations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=8)
+    raise SystemExit(1 if asyncio.run(async_main(parser.parse_args())) else 0)
+
+
+if __name__ == '__main__':
+    main()